@@ -1,116 +1,251 @@
-from calculations.Coords_Info import get_density
-from calculations.Energy_Atm import simulate_meteor_atmospheric_entry
-from calculations.Impact_Calculations import ImpactCalculations
-from calculations.Properties_Calculations import PropertiesCalculations
-from flask import Flask, jsonify, request
+from calculations.Http_Encoding import FastJSONProvider, compress_response
+from calculations.Metrics import finish_request, render as render_metrics, stage, start_request
+from calculations.Resilience import UpstreamRejected, UpstreamUnavailable, clear_budget, start_budget
+from flask import Flask, Response, jsonify, request
 from flask_cors import CORS
-import json, math, requests, os, numpy as np
+import os
+import math
 from datetime import datetime
 from dotenv import load_dotenv
 
+# Calculation modules, numpy and requests are imported inside the routes that
+# use them so workers boot without paying for them; warm_up() preloads them.
 
 # Load environment variables
 load_dotenv()
 
 app = Flask(__name__)
-CORS(app)
-
-API_KEY = os.getenv('NASA_API_KEY')
-if not API_KEY:
-    raise ValueError("NASA_API_KEY not found in environment variables. Please check your .env file.")
+app.json = FastJSONProvider(app)
+CORS(app, expose_headers=['X-Raster-Bounds', 'X-Raster-Fields', 'X-Raster-Shape'])
+
+def nasa_api_key():
+    api_key = os.getenv('NASA_API_KEY')
+    if not api_key:
+        raise ValueError("NASA_API_KEY not found in environment variables. Please check your .env file.")
+    return api_key
+
+def load_datasets():
+    """
+    Open the shared datasets, compiling their memory-mapped files first if the
+    sources changed. gunicorn compiles them before forking (compile_datasets),
+    so workers only map them.
+    """
+    from calculations.Catalog_Sync import catalog
+    from calculations.City_Index import CITIES_POPULATION_FILE, city_index
+    from calculations.Coords_Info import large_cities
+    from calculations.Population_Exposure import population_grid
+    from calculations.Soil_Raster import soil_raster
+    from calculations.Zone_Model import coastline_index
+
+    if os.path.exists(CITIES_POPULATION_FILE):
+        city_index()
+    large_cities()
+    population_grid()
+    coastline_index()
+    soil_raster()
+    catalog()
+
+def warm_up():
+    """Import calculation modules, validate API keys and load datasets ahead of the first request"""
+    from calculations import Batch_Jobs, Effects_Raster, Evacuation_Planner, Impact_Pipeline  # noqa: F401
+    from calculations.Coords_Info import google_maps_api_key
+
+    for check in (nasa_api_key, google_maps_api_key):
+        try:
+            check()
+        except ValueError as e:
+            app.logger.warning(str(e))
+    load_datasets()
+
+# --------------------- Instrumentation --------------------- #
+@app.before_request
+def begin_request_timing():
+    start_request()
+    start_budget()
+
+@app.after_request
+def end_request_timing(response):
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    finish_request(request.method, route, response.status_code)
+    clear_budget()
+    return response
+
+# Registered after the timing hook so it runs first and its cost is timed
+@app.after_request
+def compress(response):
+    return compress_response(response, request.headers.get('Accept-Encoding'))
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
 
 # --------------------- Evacuation Plan Endpoint --------------------- #
-from calculations.Coords_Info import get_location_type
-import heapq
-
 @app.route('/api/evacuation-plan', methods=['GET'])
 def evacuation_plan():
+    import numpy as np
+    from calculations.City_Index import city_index
+    from calculations.Coords_Info import get_location_type
+    from calculations.Evacuation_Planner import plan_evacuation
+    from calculations.Geometry import ring_area
+    from calculations.Population_Exposure import population_grid
+    from calculations.Zone_Model import TERRAIN_BY_LOCATION, zones_for
+
     try:
         energy_mt = float(request.args.get('energy_mt'))
         lat = float(request.args.get('latitude'))
         lon = float(request.args.get('longitude'))
     except (TypeError, ValueError):
         return jsonify({'error': 'Missing or invalid energy_mt, latitude, or longitude'}), 400
+    if not (math.isfinite(energy_mt) and energy_mt > 0):
+        return jsonify({'error': 'energy_mt must be a positive, finite number'}), 400
 
     # 1. Detect terrain type
-    terrain = get_location_type(lat, lon)
-    if terrain == 'water':
-        terrain_type = 'ocean'
-    elif terrain == 'land':
-        terrain_type = 'land'
-    else:
-        terrain_type = 'coastal'  # fallback, you can improve this logic
-
-    # 2. Define zones by terrain
-    def scale(radius):
-        return radius * (energy_mt / 10) ** (1/3)
-
-    land_zones = [
-        {"id": 'crater', "radius": scale(3)},
-        {"id": 'thermal', "radius": scale(25)},
-        {"id": 'airblast', "radius": scale(60)},
-        {"id": 'ejecta', "radius": scale(120)},
-        {"id": 'seismic', "radius": scale(200)},
-    ]
-    water_zones = [
-        {"id": 'tsunami', "radius": scale(300)},
-        {"id": 'vapor_cloud', "radius": scale(80)},
-    ]
-    coastal_zones = [
-        {"id": 'mixed_wave', "radius": scale(150)},
-        {"id": 'shockwave', "radius": scale(40)},
-    ]
-
-    if terrain_type == 'land':
-        zones = land_zones
-    elif terrain_type == 'coastal':
-        zones = coastal_zones
+    terrain_type = TERRAIN_BY_LOCATION[get_location_type(lat, lon)]
+
+    # 2. Zones for the terrain, scaled to the impact energy
+    zones = zones_for(terrain_type, energy_mt)
+
+    # 3. Affected cities from one index query over the outermost zone; each
+    #    city belongs to the smallest zone that contains it, i.e. to the ring
+    #    between that zone and the next smaller one, like the populations and
+    #    areas below (the first listed zone wins between equal radii)
+    index = city_index()
+    radii = np.array([zone['radius'] for zone in zones], dtype=float)
+    outer_radius = float(radii.max())
+    with stage('city_query'):
+        affected, distances = index.query_radius(lat, lon, outer_radius)
+    by_radius = np.argsort(radii, kind='stable')
+    ring = np.searchsorted(radii[by_radius], distances, side='left')
+    zone_of = by_radius[np.minimum(ring, len(zones) - 1)]
+
+    # 4. Schedule evacuation: closest, then largest population first, each
+    #    city sent to the nearest safe cities with shelter capacity left
+    with stage('evacuation_planning'):
+        plan = plan_evacuation(index, affected, distances, lat, lon, outer_radius)
+    def destination(dest, evacuees, travel_km):
+        # index.cities decodes a record per access, so look each one up once
+        host = index.cities[dest]
+        return {
+            'name': host['name'],
+            'latitude': host['latitude'],
+            'longitude': host['longitude'],
+            'evacuees': evacuees,
+            'travel_km': travel_km,
+        }
+
+    evac_list = []
+    for order, entry in enumerate(plan, start=1):
+        n = entry['position']
+        city = index.cities[affected[n]]
+        evac_list.append({
+            'name': city['name'],
+            'latitude': city['latitude'],
+            'longitude': city['longitude'],
+            'population': city['population'],
+            'distance': float(distances[n]),
+            'zone': zones[zone_of[n]]['id'],
+            'order': order,
+            'destinations': [destination(*d) for d in entry['destinations']],
+            'unassigned': entry['unassigned'],
+        })
+
+    # 5. Gridded population inside each damage ring (None when no grid is built)
+    grid = population_grid()
+    if grid is not None:
+        with stage('population_exposure'):
+            ring_population = grid.ring_totals(lat, lon, [zone['radius'] for zone in zones])
     else:
-        zones = water_zones
-
-    # 3. For each zone, get affected cities
-    all_cities = {}
-    for zone in zones:
-        resp = app.test_client().get(f"/api/cities?lat={lat}&lon={lon}&radius={zone['radius']}")
-        if resp.status_code == 200:
-            cities = resp.get_json()
-            for city in cities:
-                city_id = city['id']
-                dist = haversine_distance(lat, lon, city['latitude'], city['longitude'])
-                if city_id not in all_cities or dist < all_cities[city_id]['distance']:
-                    all_cities[city_id] = {
-                        'name': city['name'],
-                        'latitude': city['latitude'],
-                        'longitude': city['longitude'],
-                        'population': city['population'],
-                        'distance': dist,
-                        'zone': zone['id']
-                    }
-
-    # 4. Sort by evacuation priority: closest, then largest population
-    evac_list = list(all_cities.values())
-    evac_list.sort(key=lambda c: (c['distance'], -c['population']))
-    for i, city in enumerate(evac_list):
-        city['order'] = i + 1
-
-    # 5. Group by zone for output
+        ring_population = [None] * len(zones)
+
+    # 6. Group by zone for output; like the populations, areas are of the ring
+    #    between a zone and the next smaller one
+    inner = np.array([radii[radii < r].max(initial=0.0) for r in radii])
+    areas = ring_area(inner, radii)
     zone_output = []
-    for zone in zones:
+    for zone, population, area in zip(zones, ring_population, areas):
         zone_cities = [c for c in evac_list if c['zone'] == zone['id']]
         zone_output.append({
             'id': zone['id'],
             'radius': zone['radius'],
+            'area_km2': float(area),
+            'population': population,
             'cities': zone_cities
         })
 
     return jsonify({
         'terrain': terrain_type,
         'zones': zone_output,
-        'evacuation_order': evac_list
+        'evacuation_order': evac_list,
+        'unassigned_population': sum(c['unassigned'] for c in evac_list)
     })
+
+# --------------------- Zone Radii Route --------------------- #
+@app.route('/api/zone-radii', methods=['GET'])
+def get_zone_radii():
+    from calculations.Zone_Model import ZONES, zone_ids, zone_radii
+
+    try:
+        energies = [float(v) for arg in request.args.getlist('energy_mt') for v in arg.split(',')]
+    except ValueError:
+        return jsonify({'error': 'Invalid energy_mt'}), 400
+    if not energies or not all(math.isfinite(e) and e > 0 for e in energies):
+        return jsonify({'error': 'energy_mt must list one or more positive energies'}), 400
+
+    terrain = request.args.get('terrain')
+    if terrain is not None and terrain not in ZONES:
+        return jsonify({'error': f"terrain must be one of {', '.join(ZONES)}"}), 400
+    terrains = [terrain] if terrain else list(ZONES)
+
+    return jsonify({
+        'energies': energies,
+        'terrains': {t: {'zones': zone_ids(t), 'radii': zone_radii(t, energies).tolist()} for t in terrains}
+    })
+
+# --------------------- Impact Raster Route --------------------- #
+@app.route('/api/impact-raster', methods=['GET'])
+def impact_raster():
+    from calculations.Effects_Raster import FIELDS, effects_grid, encode_png, encode_float16
+
+    try:
+        energy_mt = float(request.args.get('energy_mt'))
+        lat = float(request.args.get('latitude'))
+        lon = float(request.args.get('longitude'))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Missing or invalid energy_mt, latitude, or longitude'}), 400
+
+    resolution = request.args.get('resolution', 256, type=int)
+    radius_km = request.args.get('radius_km', type=float)
+    output_format = request.args.get('format', 'png')
+    field = request.args.get('field', 'all')
+    fields = FIELDS if field == 'all' else (field,)
+
+    if output_format not in ('png', 'f16'):
+        return jsonify({'error': "format must be 'png' or 'f16'"}), 400
+    if field != 'all' and field not in FIELDS:
+        return jsonify({'error': f"field must be 'all' or one of {', '.join(FIELDS)}"}), 400
+
+    try:
+        with stage('raster_grid'):
+            bounds, grid = effects_grid(energy_mt, lat, lon, resolution, radius_km)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    with stage('raster_encode'):
+        if output_format == 'png':
+            response = Response(encode_png(grid, fields), mimetype='image/png')
+        else:
+            response = Response(encode_float16(grid, fields), mimetype='application/octet-stream')
+    response.headers['X-Raster-Bounds'] = ','.join(f"{v:.6f}" for v in bounds)
+    response.headers['X-Raster-Fields'] = ','.join(fields)
+    response.headers['X-Raster-Shape'] = f"{len(fields)},{grid.shape[1]},{grid.shape[2]}"
+    response.headers['Cache-Control'] = 'public, max-age=86400'
+    return response
+
 # --------------------- Impact Route --------------------- #
 @app.route('/impact', methods=['GET'])
 def impact():
+    from calculations.Impact_Pipeline import run_impact
+
     velocity = float(request.args.get('velocity'))
     mass = float(request.args.get('mass'))
     diameter = float(request.args.get('diameter'))
@@ -118,26 +253,12 @@ def impact():
     latitude = float(request.args.get('latitude'))
     longitude = float(request.args.get('longitude'))
 
-    (final_energy, final_velocity, final_mass, lost_energy, percent_lost) = simulate_meteor_atmospheric_entry(diameter, velocity, angle)
-
-    asteroid_density = (mass / ((4/3) * math.pi * (diameter/2)**3)) / 1000  # Convert to g/cm³
-    ground_density = get_density(latitude, longitude)  # g/cm³
-
-    init_crater_diameter = ImpactCalculations.calculateInitialCraterDiameter(diameter, asteroid_density, velocity, ground_density['100-200cm'])
-    excavated_mass = ImpactCalculations.calculateExcavatedMass(init_crater_diameter, ground_density['100-200cm'])
-    minimal_ejection_velocity = ImpactCalculations.calculateMinimalEjectionVelocity(init_crater_diameter)
-    percent_to_space = ImpactCalculations.calculateMassToEscapeGravity(minimal_ejection_velocity, excavated_mass)
-
-    return jsonify({
-        'percent_to_space': percent_to_space,
-        'impact_energy': final_energy,
-        'lost_energy': lost_energy,
-        'impact_energy_tnt': PropertiesCalculations.convertJoulesTNTTons(final_energy),
-        'impact_energy_hiroshima': PropertiesCalculations.convertJoulesHiroshima(final_energy),
-    })
+    return jsonify(run_impact(velocity, mass, diameter, angle, latitude, longitude))
 
 @app.route('/mitigation', methods=['GET'])
 def mitigation():
+    from calculations.Properties_Calculations import PropertiesCalculations
+
     velocity = float(request.args.get('velocity'))
     mass = float(request.args.get('mass'))
     diameter = float(request.args.get('diameter'))
@@ -154,22 +275,90 @@ def mitigation():
         'fragmentation_energy_hiroshima': PropertiesCalculations.convertJoulesHiroshima(fragmentation_energy),
     })
 
+# --------------------- Batch Jobs --------------------- #
+@app.route('/api/jobs', methods=['POST'])
+def create_job():
+    from calculations.Batch_Jobs import submit_job
+
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({"error": "Missing JSON body"}), 400
+    try:
+        status = submit_job(payload, resolve_asteroid_impact_parameters)
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(status), 202
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    from calculations.Batch_Jobs import job_status, job_results
+
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', 100, type=int), 1), 1000)
+    try:
+        status = job_status(job_id)
+    except KeyError:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify({**status, "offset": offset, "results": job_results(job_id, offset, limit)})
+
+@app.route('/api/jobs/<job_id>/stream', methods=['GET'])
+def stream_job(job_id):
+    from calculations.Batch_Jobs import job_status, stream_results
+
+    try:
+        job_status(job_id)
+    except KeyError:
+        return jsonify({"error": "Unknown job"}), 404
+    return Response(stream_results(job_id), mimetype='application/x-ndjson')
+
 # --------------------- Home Route --------------------- #
 @app.route('/')
 def home():
     return jsonify({"status": "OK", "message": "Welcome to the NASA Impact Visualizer API!"})
 
 # --------------------- NASA Asteroid Helpers --------------------- #
-def get_asteroid_data(asteroid_id, api_key=API_KEY):
-    url = f"https://api.nasa.gov/neo/rest/v1/neo/{asteroid_id}?api_key={api_key}"
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException:
-        return None
+def nasa_get(path, api_key=None, fallback=None):
+    """
+    GET a NeoWs path through the nasa_neows circuit breaker, request budget and stale cache.
+    Raises UpstreamUnavailable when there is neither an answer nor a fallback,
+    and UpstreamRejected when NeoWs refuses the request (e.g. an unknown id).
+    """
+    import requests
+    from calculations.Resilience import call_upstream
+
+    separator = '&' if '?' in path else '?'
+    url = f"https://api.nasa.gov/neo/rest/v1/{path}{separator}api_key={api_key or nasa_api_key()}"
+    return call_upstream('nasa_neows', lambda timeout: requests.get(url, timeout=timeout), key=path, fallback=fallback)
+
+def nasa_unavailable(error, status=502):
+    """Error response for a NeoWs call that could not be answered"""
+    import requests
+
+    if error.reason != 'error':
+        return jsonify({"error": "NASA API temporarily unavailable, please retry shortly"}), 503
+    if isinstance(error.cause, requests.exceptions.Timeout):
+        return jsonify({"error": "NASA API timed out"}), 504
+    return jsonify({"error": f"Error connecting to NASA API: {str(error.cause)}"}), status
+
+def nasa_rejected(error):
+    """Error response for a NeoWs call refused as the client's fault"""
+    if error.status == 404:
+        return jsonify({"error": "Asteroid not found"}), 404
+    return jsonify({"error": f"NASA API rejected the request ({error.status})"}), 400
+
+def get_asteroid_data(asteroid_id, api_key=None):
+    """NeoWs object from the synced local catalog, else from NASA (cached), or None"""
+    from calculations.Catalog_Sync import catalog
+
+    asteroid = catalog().get(asteroid_id)
+    if asteroid is not None:
+        return asteroid
+    return nasa_get(f"neo/{asteroid_id}", api_key, fallback=lambda: None)
 
 def get_orbital_data(asteroid_id, target_date_str):
+    import numpy as np
+    from calculations.Catalog_Sync import derived
+
     asteroid_json = get_asteroid_data(asteroid_id)
     if not asteroid_json or 'orbital_data' not in asteroid_json:
         return None
@@ -182,19 +371,20 @@ def get_orbital_data(asteroid_id, target_date_str):
     w = np.deg2rad(float(orbital_data['perihelion_argument']))
     omega = np.deg2rad(float(orbital_data['ascending_node_longitude']))
 
-    # Orbit path
-    nu_path = np.linspace(0, 2 * np.pi, 360)
-    r_path = a * (1 - e**2) / (1 + e * np.cos(nu_path))
-    x_orb_path = r_path * np.cos(nu_path)
-    y_orb_path = r_path * np.sin(nu_path)
-    x_rot1 = x_orb_path * np.cos(w) - y_orb_path * np.sin(w)
-    y_rot1 = x_orb_path * np.sin(w) + y_orb_path * np.cos(w)
-    x_rot2 = x_rot1
-    y_rot2 = y_rot1 * np.cos(i)
-    z_rot2 = y_rot1 * np.sin(i)
-    x_final_path = (x_rot2 * np.cos(omega) - y_rot2 * np.sin(omega)).tolist()
-    y_final_path = (x_rot2 * np.sin(omega) + y_rot2 * np.cos(omega)).tolist()
-    z_final_path = z_rot2.tolist()
+    # Orbit path, recomputed only when a catalog sync changed this asteroid
+    def orbit_path():
+        nu_path = np.linspace(0, 2 * np.pi, 360)
+        r_path = a * (1 - e**2) / (1 + e * np.cos(nu_path))
+        x_orb_path = r_path * np.cos(nu_path)
+        y_orb_path = r_path * np.sin(nu_path)
+        x_rot1 = x_orb_path * np.cos(w) - y_orb_path * np.sin(w)
+        y_rot1 = x_orb_path * np.sin(w) + y_orb_path * np.cos(w)
+        x_rot2 = x_rot1
+        y_rot2 = y_rot1 * np.cos(i)
+        z_rot2 = y_rot1 * np.sin(i)
+        return {"x": (x_rot2 * np.cos(omega) - y_rot2 * np.sin(omega)).tolist(),
+                "y": (x_rot2 * np.sin(omega) + y_rot2 * np.cos(omega)).tolist(),
+                "z": z_rot2.tolist()}
 
     # Current position
     M0 = np.deg2rad(float(orbital_data['mean_anomaly']))
@@ -227,10 +417,43 @@ def get_orbital_data(asteroid_id, target_date_str):
 
     return {
         "asteroid_name": asteroid_json.get('name', 'Unknown'),
-        "orbit_path": {"x": x_final_path, "y": y_final_path, "z": z_final_path},
+        "orbit_path": derived(asteroid_id, 'orbit_path', orbit_path),
         "asteroid_position": {"x": x_final_pos, "y": y_final_pos, "z": z_final_pos}
     }
 
+def estimate_asteroid_properties(asteroid, albedo=0.15):
+    """Physical properties estimated from a NeoWs object (albedo assumed)"""
+    from calculations.Properties_Calculations import PropertiesCalculations
+
+    diam_min = asteroid["estimated_diameter"]["meters"]["estimated_diameter_min"]
+    diam_max = asteroid["estimated_diameter"]["meters"]["estimated_diameter_max"]
+    diameter = (diam_min + diam_max) / 2
+    mass, density_g_cm3, complex_type = PropertiesCalculations.estimateMass(diameter, albedo)
+
+    if asteroid.get("close_approach_data"):
+        velocity = float(asteroid["close_approach_data"][0]["relative_velocity"]["kilometers_per_second"]) * 1000
+    else:
+        velocity = 20000
+
+    return {
+        "diameter_min": diam_min,
+        "diameter_max": diam_max,
+        "diameter": diameter,
+        "albedo": albedo,
+        "mass": mass,
+        "density": density_g_cm3,
+        "complex_type": complex_type,
+        "velocity": velocity,
+    }
+
+def resolve_asteroid_impact_parameters(asteroid_id):
+    """Diameter, velocity and mass of a NeoWs asteroid for batch jobs, or None"""
+    asteroid_json = get_asteroid_data(asteroid_id)
+    if not asteroid_json:
+        return None
+    properties = estimate_asteroid_properties(asteroid_json)
+    return {key: properties[key] for key in ("diameter", "velocity", "mass")}
+
 # --------------------- Orbital Data Route --------------------- #
 @app.route('/api/orbital-data', methods=['POST'])
 def orbital_data_api():
@@ -245,18 +468,86 @@ def orbital_data_api():
     else:
         return jsonify({"error": "Invalid Asteroid ID or NASA API Error."}), 404
 
-# --------------------- Cities Route --------------------- #
-def haversine_distance(lat1, lon1, lat2, lon2):
-    R = 6371  # km
-    dlat = math.radians(lat2 - lat1)
-    dlon = math.radians(lon2 - lon1)
-    a = math.sin(dlat/2)**2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon/2)**2
-    return R * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+# --------------------- Close Approach Screening --------------------- #
+@app.route('/api/close-approaches', methods=['POST'])
+def close_approaches():
+    from calculations.Close_Approach import screen
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Missing JSON body"}), 400
+    asteroid_ids = data.get('asteroid_ids') or []
+    try:
+        start = datetime.strptime(data.get('start_date') or datetime.utcnow().strftime('%Y-%m-%d'), '%Y-%m-%d')
+        days = float(data.get('days', 365))
+        step_days = float(data.get('step_days', 1))
+        limit = int(data['limit']) if data.get('limit') is not None else None
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid start_date (YYYY-MM-DD), days, step_days or limit"}), 400
+    if not isinstance(asteroid_ids, list) or not asteroid_ids:
+        return jsonify({"error": "asteroid_ids must be a non-empty list"}), 400
+    if len(asteroid_ids) > 500 or not 0 < days <= 3650 or not 0.1 <= step_days <= 10:
+        return jsonify({"error": "At most 500 asteroids, days in (0, 3650] and step_days in [0.1, 10]"}), 400
+    if limit is not None and limit <= 0:
+        return jsonify({"error": "limit must be a positive integer"}), 400
+
+    # Elements come from the NeoWs cache; only ids not seen recently cost a NASA call
+    objects, missing = [], []
+    for asteroid_id in asteroid_ids:
+        asteroid = get_asteroid_data(str(asteroid_id))
+        if asteroid:
+            objects.append({'id': asteroid.get('id', str(asteroid_id)), 'name': asteroid.get('name'),
+                            'orbital_data': asteroid.get('orbital_data')})
+        else:
+            missing.append(asteroid_id)
 
+    with stage('close_approach_screening'):
+        ranked, skipped = screen(objects, start, days, step_days, limit)
+    return jsonify({
+        "start_date": start.strftime('%Y-%m-%d'),
+        "days": days,
+        "approaches": ranked,
+        "unresolved": missing + skipped,
+    })
+
+# --------------------- Catalog Sync --------------------- #
+def sync_authorized():
+    """True when the request carries CATALOG_SYNC_TOKEN; syncs spend the NASA key's quota"""
+    import hmac
+
+    token = os.getenv('CATALOG_SYNC_TOKEN')
+    supplied = request.headers.get('Authorization', '')
+    return bool(token) and hmac.compare_digest(supplied.encode(), f"Bearer {token}".encode())
+
+@app.route('/api/catalog/sync', methods=['POST'])
+def start_catalog_sync():
+    import threading
+    from calculations.Catalog_Sync import PAGES_PER_SYNC, sync_catalog
+
+    if not sync_authorized():
+        return jsonify({"error": "Catalog sync requires a valid CATALOG_SYNC_TOKEN bearer token"}), 403
+    pages = min(max(request.args.get('pages', PAGES_PER_SYNC, type=int), 1), PAGES_PER_SYNC)
+
+    def run():
+        try:
+            sync_catalog(pages)
+        except (RuntimeError, ValueError) as e:
+            app.logger.warning(f"Catalog sync not run: {e}")
+
+    threading.Thread(target=run, name='catalog-sync', daemon=True).start()
+    return jsonify({"status": "started", "pages": pages}), 202
+
+@app.route('/api/catalog/sync', methods=['GET'])
+def catalog_sync_status():
+    from calculations.Catalog_Sync import catalog
+
+    current = catalog()
+    return jsonify({"objects": len(current), "last_sync": current.index.get('last_sync')})
+
+# --------------------- Cities Route --------------------- #
 @app.route("/api/cities")
 def get_cities_in_radius():
-    with open("cities_population.json", "r", encoding="utf-8") as f:
-        cities = json.load(f)
+    from calculations.City_Index import city_index
 
     try:
         lat = float(request.args.get("lat"))
@@ -265,8 +556,10 @@ def get_cities_in_radius():
     except (TypeError, ValueError):
         return jsonify({"error": "Missing or invalid lat/lon/radius"}), 400
 
-    affected = [city for city in cities if haversine_distance(lat, lon, city["latitude"], city["longitude"]) <= radius]
-    return jsonify(affected)
+    index = city_index()
+    with stage('city_query'):
+        affected, _ = index.query_radius(lat, lon, radius)
+    return jsonify([index.cities[i] for i in affected])
 
 # --------------------- Asteroids List --------------------- #
 @app.route('/api/asteroids', methods=['GET'])
@@ -274,10 +567,7 @@ def get_asteroids():
     page = request.args.get('page', 0, type=int)
     
     try:
-        url = f"https://api.nasa.gov/neo/rest/v1/neo/browse?api_key={API_KEY}&page={page}"
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        data = response.json()
+        data = nasa_get(f"neo/browse?page={page}")
         
         neo_list = data.get("near_earth_objects", [])
         if not neo_list:
@@ -286,10 +576,10 @@ def get_asteroids():
         asteroids = [{"id": a["id"], "name": a["name"]} for a in neo_list]
         return jsonify({"asteroids": asteroids, "page": page})
         
-    except requests.exceptions.Timeout:
-        return jsonify({"error": "NASA API timed out"}), 504
-    except requests.exceptions.RequestException as e:
-        return jsonify({"error": f"Error connecting to NASA API: {str(e)}"}), 502
+    except UpstreamUnavailable as e:
+        return nasa_unavailable(e)
+    except UpstreamRejected as e:
+        return nasa_rejected(e)
 
 # --------------------- Search Asteroids --------------------- #
 @app.route('/api/asteroids/search', methods=['GET'])
@@ -300,55 +590,57 @@ def search_asteroids():
 
     asteroid_list = []
     seen_ids = set()
-    try:
-        for page in range(5):
-            url = f"https://api.nasa.gov/neo/rest/v1/neo/browse?api_key={API_KEY}&page={page}&size=20"
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-
-            for a in data.get("near_earth_objects", []):
-                asteroid_id = a["id"]
-                asteroid_name = a["name"]
-                
-                if (query.lower() in asteroid_name.lower() or query == asteroid_id) and asteroid_id not in seen_ids:
-                    asteroid_list.append({"id": asteroid_id, "name": asteroid_name})
-                    seen_ids.add(asteroid_id)
-                    if query == asteroid_id:
-                        return jsonify({"asteroids": [{"id": asteroid_id, "name": asteroid_name}]})
-
-            if len(asteroid_list) >= 50:
-                break
-
-        return jsonify({"asteroids": asteroid_list[:50]})
-    except requests.exceptions.RequestException as e:
-        return jsonify({"error": f"Error connecting to NASA API: {str(e)}"}), 500
+    for page in range(5):
+        try:
+            data = nasa_get(f"neo/browse?page={page}&size=20")
+        except (UpstreamUnavailable, UpstreamRejected) as e:
+            if page == 0:
+                return nasa_rejected(e) if isinstance(e, UpstreamRejected) else nasa_unavailable(e, 500)
+            # Later pages failing still leaves a usable, if shorter, result list
+            return jsonify({"asteroids": asteroid_list[:50], "partial": True})
+
+        for a in data.get("near_earth_objects", []):
+            asteroid_id = a["id"]
+            asteroid_name = a["name"]
+            
+            if (query.lower() in asteroid_name.lower() or query == asteroid_id) and asteroid_id not in seen_ids:
+                asteroid_list.append({"id": asteroid_id, "name": asteroid_name})
+                seen_ids.add(asteroid_id)
+                if query == asteroid_id:
+                    return jsonify({"asteroids": [{"id": asteroid_id, "name": asteroid_name}]})
+
+        if len(asteroid_list) >= 50:
+            break
+
+    return jsonify({"asteroids": asteroid_list[:50]})
 
 # --------------------- Asteroid Details --------------------- #
 @app.route('/api/asteroid-details', methods=['POST'])
 def asteroid_details():
+    from calculations.Catalog_Sync import catalog, derived
+    from calculations.Properties_Calculations import PropertiesCalculations
+
     data = request.json
     asteroid_id = data.get("asteroid_id")
     if not asteroid_id:
         return jsonify({"error": "Missing asteroid_id"}), 400
 
     try:
-        url = f"https://api.nasa.gov/neo/rest/v1/neo/{asteroid_id}?api_key={API_KEY}"
-        response = requests.get(url)
-        response.raise_for_status()
-        asteroid = response.json()
-
-        diam_min = asteroid["estimated_diameter"]["meters"]["estimated_diameter_min"]
-        diam_max = asteroid["estimated_diameter"]["meters"]["estimated_diameter_max"]
-        diameter_avg = (diam_min + diam_max) / 2
-        albedo = 0.15  # assumed
-
-        mass, density, complex_type = PropertiesCalculations.estimateMass(diameter_avg, albedo)
-
-        if asteroid["close_approach_data"]:
-            velocity = float(asteroid["close_approach_data"][0]["relative_velocity"]["kilometers_per_second"]) * 1000
-        else:
-            velocity = 20000
+        asteroid = catalog().get(asteroid_id) or nasa_get(f"neo/{asteroid_id}")
+    except UpstreamUnavailable as e:
+        return nasa_unavailable(e, 500)
+    except UpstreamRejected as e:
+        return nasa_rejected(e)
+
+    def details():
+        properties = estimate_asteroid_properties(asteroid)
+        diam_min = properties["diameter_min"]
+        diam_max = properties["diameter_max"]
+        diameter_avg = properties["diameter"]
+        albedo = properties["albedo"]
+        mass = properties["mass"]
+        complex_type = properties["complex_type"]
+        velocity = properties["velocity"]
 
         kinetic_energy = PropertiesCalculations.calculateKineticEnergyByMass(mass, velocity)
         tnt_equivalent = PropertiesCalculations.convertJoulesTNTTons(kinetic_energy)
@@ -356,11 +648,10 @@ def asteroid_details():
         fragmentation_energy = PropertiesCalculations.aproximateFragmentationEnergy(kinetic_energy)
         safe_distance_km = PropertiesCalculations.aproximateSafeDistance(diameter_avg) / 1000
 
-        mass, density_g_cm3, complex_type = PropertiesCalculations.estimateMass(diameter_avg, albedo)
         # Convert density from g/cm³ to kg/m³ for frontend display
-        density_kg_m3 = PropertiesCalculations.convert_density_to_kg_m3(density_g_cm3)
+        density_kg_m3 = PropertiesCalculations.convert_density_to_kg_m3(properties["density"])
 
-        return jsonify({
+        return {
             "name": asteroid.get("name"),
             "designation": asteroid.get("designation", "Unknown"),
             "absolute_magnitude_h": asteroid.get("absolute_magnitude_h"),
@@ -385,10 +676,10 @@ def asteroid_details():
             "energy_hiroshima_bombs": hiroshima_equivalent,
             "fragmentation_energy_joules": fragmentation_energy,
             "safe_distance_km": safe_distance_km
-        })
+        }
 
-    except requests.exceptions.RequestException as e:
-        return jsonify({"error": str(e)}), 500
+    # Recomputed only when a catalog sync changed this asteroid
+    return jsonify(derived(asteroid_id, 'details', details))
 
 # --------------------- Run Server --------------------- #
 if __name__ == '__main__':
@@ -0,0 +1,38 @@
+"""
+Run the benchmark suite against stubbed upstreams.
+
+    python -m benchmarks [--group calculations|endpoints|<case>] [--check]
+
+Results are appended to benchmarks/results/history.jsonl; --check exits
+non-zero when a case's p50 exceeds its budget or regresses past the
+threshold against the median of the previous runs.
+"""
+import sys
+import argparse
+from benchmarks import cases  # noqa: F401  (registers the cases)
+from benchmarks.harness import HISTORY_FILE, REGRESSION_THRESHOLD, append_history, load_history, regressions, run_all
+from benchmarks.stubs import stub_upstreams
+
+def main():
+    parser = argparse.ArgumentParser(description="Meteor Madness back-end benchmarks")
+    parser.add_argument('--group', action='append', help="group or case name to run (repeatable)")
+    parser.add_argument('--min-time', type=float, default=1.0, help="seconds to spend per case")
+    parser.add_argument('--history', default=HISTORY_FILE)
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD)
+    parser.add_argument('--check', action='store_true', help="fail on p50 regressions")
+    parser.add_argument('--no-save', action='store_true', help="do not append this run to the history")
+    args = parser.parse_args()
+
+    history = load_history(args.history)
+    with stub_upstreams():
+        run = run_all(args.group, args.min_time)
+    if not args.no_save:
+        append_history(run, args.history)
+
+    slower = regressions(run['results'], history, args.threshold)
+    for name, baseline, p50 in slower:
+        print(f"REGRESSION {name}: p50 {p50:.3f} ms vs limit {baseline:.3f} ms")
+    return 1 if args.check and slower else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,83 @@
+import os
+import sys
+import tempfile
+import subprocess
+import numpy as np
+from benchmarks.harness import case
+from benchmarks.stubs import write_synthetic_cities
+
+DATA_DIR = tempfile.mkdtemp(prefix="meteor-bench-")
+os.environ.setdefault('NASA_API_KEY', 'benchmark')
+os.environ.setdefault('GOOGLE_MAPS_API_KEY', 'benchmark')
+os.environ.setdefault('DATASET_DIR', os.path.join(DATA_DIR, "datasets"))
+
+import calculations.City_Index as City_Index
+from calculations.Air_Calculations import air_density
+from calculations.Energy_Atm import simulate_meteor_atmospheric_entry
+
+CITIES_FILE = os.path.join(DATA_DIR, "cities_population.json")
+write_synthetic_cities(CITIES_FILE)
+City_Index.CITIES_POPULATION_FILE = CITIES_FILE
+City_Index.city_index.cache_clear()
+
+def client():
+    from app import app
+    return app.test_client()
+
+BACK_END_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BOOT_BUDGET_MS = 1000
+
+# --------------------- Startup --------------------- #
+def _fresh_interpreter(code):
+    return lambda: subprocess.run([sys.executable, '-c', code], cwd=BACK_END_DIR, check=True)
+
+@case('import app', 'startup', budget_ms=BOOT_BUDGET_MS)
+def import_app():
+    return _fresh_interpreter('import app')
+
+@case('boot to first request', 'startup', budget_ms=BOOT_BUDGET_MS)
+def first_request():
+    return _fresh_interpreter("import app; app.app.test_client().get('/')")
+
+# --------------------- Calculations --------------------- #
+@case('atmospheric_entry', 'calculations')
+def atmospheric_entry():
+    return lambda: simulate_meteor_atmospheric_entry(500, 20000, 45)
+
+@case('air_density_profile', 'calculations')
+def air_density_profile():
+    altitudes = np.linspace(0, 100_000, 1001)
+    return lambda: [air_density(h) for h in altitudes]
+
+@case('orbital_data', 'calculations')
+def orbital_data():
+    from app import get_orbital_data
+    return lambda: get_orbital_data('2000433', '2025-01-01')
+
+@case('city_radius_query', 'calculations')
+def city_radius_query():
+    index = City_Index.city_index()
+    return lambda: index.query_radius(20.0, -100.0, 500)
+
+# --------------------- Endpoints --------------------- #
+@case('GET /impact', 'endpoints')
+def impact_endpoint():
+    c = client()
+    url = '/impact?velocity=20000&mass=1.5e11&diameter=450&angle=45&latitude=20.68&longitude=-103.41'
+    return lambda: c.get(url)
+
+@case('GET /api/evacuation-plan', 'endpoints')
+def evacuation_plan_endpoint():
+    c = client()
+    url = '/api/evacuation-plan?energy_mt=1000&latitude=20.68&longitude=-103.41'
+    return lambda: c.get(url)
+
+@case('GET /api/cities', 'endpoints')
+def cities_endpoint():
+    c = client()
+    return lambda: c.get('/api/cities?lat=20.68&lon=-103.41&radius=500')
+
+@case('POST /api/orbital-data', 'endpoints')
+def orbital_data_endpoint():
+    c = client()
+    return lambda: c.post('/api/orbital-data', json={'asteroid_id': '2000433', 'target_date': '2025-01-01'})
@@ -0,0 +1,110 @@
+import os
+import json
+import time
+import platform
+import statistics
+import subprocess
+
+HISTORY_FILE = os.getenv('BENCH_HISTORY', os.path.join(os.path.dirname(__file__), "results", "history.jsonl"))
+BASELINE_RUNS = 5             # previous runs whose median p50 is the baseline
+REGRESSION_THRESHOLD = 0.20   # allowed p50 slowdown against the baseline
+
+_cases = []
+
+def case(name, group, budget_ms=None):
+    """
+    Register a benchmark: a function returning the callable to time.
+    budget_ms is an absolute p50 limit checked on every run.
+    """
+    def register(setup):
+        _cases.append({'name': name, 'group': group, 'setup': setup, 'budget_ms': budget_ms})
+        return setup
+    return register
+
+def cases(selected=None):
+    return [c for c in _cases if not selected or c['group'] in selected or c['name'] in selected]
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    k = (len(ordered) - 1) * q
+    low = int(k)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (k - low)
+
+def measure(fn, min_time=1.0, min_runs=20, max_runs=10_000, warmup=3):
+    """
+    Time repeated calls of fn.
+
+    Returns:
+        dict: runs, ops_per_s, mean/p50/p99/max in milliseconds
+    """
+    for _ in range(warmup):
+        fn()
+    samples = []
+    start = time.perf_counter()
+    while len(samples) < max_runs and (len(samples) < min_runs or time.perf_counter() - start < min_time):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    total = sum(samples)
+    return {
+        'runs': len(samples),
+        'ops_per_s': len(samples) / total if total else float('inf'),
+        'mean_ms': 1000 * statistics.fmean(samples),
+        'p50_ms': 1000 * percentile(samples, 0.50),
+        'p99_ms': 1000 * percentile(samples, 0.99),
+        'max_ms': 1000 * max(samples),
+    }
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(__file__), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def load_history(path=HISTORY_FILE):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def append_history(run, path=HISTORY_FILE):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(run) + "\n")
+
+def regressions(results, history, threshold=REGRESSION_THRESHOLD):
+    """
+    Cases over their p50 budget, or more than threshold slower than the
+    median p50 of recent runs, as (name, limit, p50) tuples.
+    """
+    found = []
+    budgets = {c['name']: c['budget_ms'] for c in _cases if c['budget_ms'] is not None}
+    for name, stats in results.items():
+        if name in budgets and stats['p50_ms'] > budgets[name]:
+            found.append((name, budgets[name], stats['p50_ms']))
+            continue
+        previous = [run['results'][name]['p50_ms'] for run in history if name in run['results']][-BASELINE_RUNS:]
+        if not previous:
+            continue
+        baseline = statistics.median(previous)
+        if stats['p50_ms'] > baseline * (1 + threshold):
+            found.append((name, baseline, stats['p50_ms']))
+    return found
+
+def run_all(selected=None, min_time=1.0):
+    results = {}
+    for c in cases(selected):
+        fn = c['setup']()
+        results[c['name']] = measure(fn, min_time=min_time)
+        stats = results[c['name']]
+        print(f"{c['name']:<32} {stats['ops_per_s']:>10.1f} ops/s   p50 {stats['p50_ms']:>9.3f} ms   "
+              f"p99 {stats['p99_ms']:>9.3f} ms   ({stats['runs']} runs)")
+    return {
+        'timestamp': time.time(),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'results': results,
+    }
@@ -0,0 +1,251 @@
+"""
+Replay a request mix against the app with stubbed upstreams and report
+throughput and latency percentiles per endpoint and worker configuration.
+
+    python -m benchmarks.loadtest [--mix FILE | --access-log FILE] [--config 4x1 --config 2x4]
+                                  [--duration 10] [--latency 0.1 --latency api.nasa.gov=0.4]
+                                  [--error-rate soilgrids=0.05] [--output results.json]
+
+A configuration WxT forks W worker processes from a parent that has already
+compiled and loaded the datasets, so they share its mapped pages, each running T request
+loops through the Flask test client: T=1 models sync workers, T>1 gthread
+workers. Loops are closed (the next request goes out as soon as the previous
+one answers), so the throughput reported is the capacity of the configuration.
+
+Without --mix a synthetic mix of /impact, /api/evacuation-plan,
+/api/orbital-data and /api/asteroids/search is generated; --save-mix writes it
+out as JSONL ({"method", "path", "json"} per line) for editing or reuse.
+--access-log replays the GET requests of a gunicorn/nginx access log.
+"""
+import re
+import sys
+import math
+import json
+import time
+import random
+import argparse
+import threading
+import multiprocessing
+from urllib.parse import urlencode, urlsplit
+from benchmarks import cases  # noqa: F401  (synthetic datasets, set up before the app is imported)
+from benchmarks.harness import percentile
+from benchmarks.stubs import stub_upstreams
+
+DEFAULT_CONFIGS = ['1x1', '2x1', '4x1', '2x4']
+DURATION_S = 10.0
+WARMUP_S = 2.0                # per configuration; requests started earlier are not measured
+MIX_SIZE = 5000
+SYNTHETIC_WEIGHTS = {'impact': 40, 'orbital_data': 25, 'search': 20, 'evacuation_plan': 15}
+STONE_DENSITY = 3000          # kg/m³, for synthetic impactor masses
+REQUEST_LINE = re.compile(r'"(GET|HEAD) (\S+) HTTP/[\d.]+"')
+
+# --------------------- Request mixes --------------------- #
+def _point(rng):
+    # Rounded like map clicks, so repeated points hit the upstream caches
+    return round(rng.uniform(-56, 70), 2), round(rng.uniform(-180, 180), 2)
+
+def _impact(rng):
+    lat, lon = _point(rng)
+    diameter = round(10 ** rng.uniform(1, 3))
+    mass = STONE_DENSITY * math.pi / 6 * diameter**3
+    query = {'velocity': rng.randrange(11000, 40000, 500), 'mass': f"{mass:.4g}", 'diameter': diameter,
+             'angle': rng.randrange(15, 91, 5), 'latitude': lat, 'longitude': lon}
+    return {'method': 'GET', 'path': '/impact?' + urlencode(query)}
+
+def _evacuation_plan(rng):
+    lat, lon = _point(rng)
+    query = {'energy_mt': f"{10 ** rng.uniform(0, 4):.3g}", 'latitude': lat, 'longitude': lon}
+    return {'method': 'GET', 'path': '/api/evacuation-plan?' + urlencode(query)}
+
+def _orbital_data(rng):
+    body = {'asteroid_id': str(2000000 + rng.randrange(2000)),
+            'target_date': f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"}
+    return {'method': 'POST', 'path': '/api/orbital-data', 'json': body}
+
+def _search(rng):
+    # Ids past the first five browse pages make the route read all of them
+    return {'method': 'GET', 'path': '/api/asteroids/search?' + urlencode({'query': 2000000 + rng.randrange(200)})}
+
+GENERATORS = {'impact': _impact, 'evacuation_plan': _evacuation_plan, 'orbital_data': _orbital_data,
+              'search': _search}
+
+def synthetic_mix(size=MIX_SIZE, weights=SYNTHETIC_WEIGHTS, seed=0):
+    """Requests drawn from the weighted endpoint mix"""
+    rng = random.Random(seed)
+    kinds = rng.choices(list(weights), weights=list(weights.values()), k=size)
+    return [GENERATORS[kind](rng) for kind in kinds]
+
+def read_mix(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def write_mix(mix, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        for entry in mix:
+            f.write(json.dumps(entry) + "\n")
+
+def read_access_log(path):
+    """GET requests in log order; POST bodies are not logged, so POSTs are skipped"""
+    with open(path, encoding='utf-8', errors='replace') as f:
+        return [{'method': 'GET', 'path': m.group(2)} for m in map(REQUEST_LINE.search, f) if m]
+
+def endpoint(entry):
+    return f"{entry.get('method', 'GET')} {urlsplit(entry['path']).path}"
+
+# --------------------- Workers --------------------- #
+def _request_loop(client, mix, start, stop_at, measure_from, samples, statuses):
+    i = start
+    while True:
+        entry = mix[i % len(mix)]
+        i += 1
+        t0 = time.perf_counter()
+        if t0 >= stop_at:
+            return
+        response = client.open(entry['path'], method=entry.get('method', 'GET'), json=entry.get('json'))
+        elapsed = time.perf_counter() - t0
+        response.close()
+        if t0 >= measure_from:
+            name = endpoint(entry)
+            samples.setdefault(name, []).append(elapsed)
+            statuses.setdefault(name, {}).setdefault(response.status_code, 0)
+            statuses[name][response.status_code] += 1
+
+def _worker(worker, threads, mix, start_at, duration_s, warmup_s, latency, error_rate, results):
+    """One worker process: `threads` request loops against its own copy of the app"""
+    from app import app
+    samples = [{} for _ in range(threads)]
+    statuses = [{} for _ in range(threads)]
+    measure_from, stop_at = start_at + warmup_s, start_at + warmup_s + duration_s
+    with stub_upstreams(latency, error_rate, seed=worker):
+        loops = [threading.Thread(target=_request_loop,
+                                  args=(app.test_client(), mix, random.Random(worker * 1000 + t).randrange(len(mix)),
+                                        stop_at, measure_from, samples[t], statuses[t]))
+                 for t in range(threads)]
+        time.sleep(max(start_at - time.perf_counter(), 0))
+        for loop in loops:
+            loop.start()
+        for loop in loops:
+            loop.join()
+    results.put((samples, statuses))
+
+def run_config(mix, workers, threads, duration_s=DURATION_S, warmup_s=WARMUP_S, latency=0.0, error_rate=0.0):
+    """
+    Replay mix with `workers` processes of `threads` loops each.
+
+    Returns:
+        dict: overall req/s and per-endpoint requests, req/s, p50/p95/p99/max ms and status counts
+    """
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    start_at = time.perf_counter() + 0.5
+    processes = [context.Process(target=_worker, args=(w, threads, mix, start_at, duration_s, warmup_s,
+                                                       latency, error_rate, results))
+                 for w in range(workers)]
+    for process in processes:
+        process.start()
+    samples, statuses = {}, {}
+    for _ in processes:
+        worker_samples, worker_statuses = results.get()
+        for per_thread in worker_samples:
+            for name, values in per_thread.items():
+                samples.setdefault(name, []).extend(values)
+        for per_thread in worker_statuses:
+            for name, counts in per_thread.items():
+                for status, count in counts.items():
+                    statuses.setdefault(name, {}).setdefault(status, 0)
+                    statuses[name][status] += count
+    for process in processes:
+        process.join()
+
+    endpoints = {}
+    for name, values in sorted(samples.items()):
+        endpoints[name] = {
+            'requests': len(values),
+            'req_per_s': len(values) / duration_s,
+            'p50_ms': 1000 * percentile(values, 0.50),
+            'p95_ms': 1000 * percentile(values, 0.95),
+            'p99_ms': 1000 * percentile(values, 0.99),
+            'max_ms': 1000 * max(values),
+            'statuses': {str(status): count for status, count in sorted(statuses[name].items())},
+        }
+    total = sum(e['requests'] for e in endpoints.values())
+    return {'workers': workers, 'threads': threads, 'duration_s': duration_s,
+            'req_per_s': total / duration_s, 'endpoints': endpoints}
+
+# --------------------- Command line --------------------- #
+def host_setting(values):
+    """--latency/--error-rate arguments ('0.1' or 'host fragment=0.1') as a StubUpstreams setting"""
+    setting = {}
+    for value in values or []:
+        host, _, number = value.rpartition('=')
+        setting[host or '*'] = float(number)
+    return setting.get('*', 0.0) if set(setting) <= {'*'} else setting
+
+def parse_config(value):
+    try:
+        workers, threads = (int(n) for n in value.lower().split('x'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected WORKERSxTHREADS, e.g. 4x1, not {value!r}")
+    if workers < 1 or threads < 1:
+        raise argparse.ArgumentTypeError("workers and threads must be at least 1")
+    return workers, threads
+
+def print_report(result):
+    errors = sum(count for e in result['endpoints'].values()
+                 for status, count in e['statuses'].items() if int(status) >= 500)
+    total = sum(e['requests'] for e in result['endpoints'].values())
+    print(f"\n{result['workers']} workers x {result['threads']} threads: {result['req_per_s']:.1f} req/s, "
+          f"{errors} of {total} responses 5xx")
+    for name, e in result['endpoints'].items():
+        statuses = ' '.join(f"{status}:{count}" for status, count in e['statuses'].items())
+        print(f"  {name:<32} {e['req_per_s']:>8.1f} req/s   p50 {e['p50_ms']:>8.1f}   p95 {e['p95_ms']:>8.1f}   "
+              f"p99 {e['p99_ms']:>8.1f} ms   [{statuses}]")
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a request mix against the back-end with stubbed upstreams")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--mix', help="JSONL request mix to replay")
+    source.add_argument('--access-log', help="access log whose GET requests are replayed")
+    parser.add_argument('--save-mix', help="write the request mix used to this JSONL file")
+    parser.add_argument('--size', type=int, default=MIX_SIZE, help="synthetic mix length")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--config', action='append', type=parse_config, metavar='WxT',
+                        help=f"workers x threads, repeatable (default {' '.join(DEFAULT_CONFIGS)})")
+    parser.add_argument('--duration', type=float, default=DURATION_S, help="measured seconds per configuration")
+    parser.add_argument('--warmup', type=float, default=WARMUP_S)
+    parser.add_argument('--latency', action='append', metavar='[HOST=]SECONDS',
+                        help="upstream latency, for every host or those whose URL contains HOST")
+    parser.add_argument('--error-rate', action='append', metavar='[HOST=]RATE',
+                        help="share of upstream calls answered with 503")
+    parser.add_argument('--output', help="write the results as JSON")
+    args = parser.parse_args()
+
+    if args.mix:
+        mix = read_mix(args.mix)
+    elif args.access_log:
+        mix = read_access_log(args.access_log)
+    else:
+        mix = synthetic_mix(args.size, seed=args.seed)
+    if not mix:
+        parser.error("the request mix is empty")
+    if args.save_mix:
+        write_mix(mix, args.save_mix)
+
+    # Load datasets before forking, so workers share them like gunicorn's
+    from app import load_datasets
+    load_datasets()
+
+    latency, error_rate = host_setting(args.latency), host_setting(args.error_rate)
+    results = []
+    for workers, threads in args.config or [parse_config(c) for c in DEFAULT_CONFIGS]:
+        result = run_config(mix, workers, threads, args.duration, args.warmup, latency, error_rate)
+        print_report(result)
+        results.append(result)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'latency': latency, 'error_rate': error_rate, 'requests_in_mix': len(mix),
+                       'runs': results}, f, indent=2)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,125 @@
+"""
+Local stand-ins for the NASA NeoWs, Google Elevation and SoilGrids APIs,
+plus a synthetic cities dataset, so benchmarks run offline and repeatably.
+"""
+import json
+import random
+import time
+from contextlib import contextmanager
+from unittest import mock
+import numpy as np
+import requests
+
+ELEVATION_M = 1500
+
+ORBITAL_DATA = {
+    "orbit_determination_date": "2024-06-01 06:12:45",
+    "eccentricity": "0.4468",
+    "semi_major_axis": "1.4579",
+    "inclination": "10.828",
+    "ascending_node_longitude": "304.30",
+    "perihelion_argument": "178.82",
+    "mean_anomaly": "310.55",
+    "mean_motion": "0.5603",
+}
+
+def neo(asteroid_id):
+    """A NeoWs /neo/{id} payload"""
+    return {
+        "id": str(asteroid_id),
+        "name": f"({asteroid_id} Stub)",
+        "designation": str(asteroid_id),
+        "absolute_magnitude_h": 19.2,
+        "estimated_diameter": {"meters": {"estimated_diameter_min": 350.0, "estimated_diameter_max": 780.0}},
+        "is_potentially_hazardous_asteroid": False,
+        "nasa_jpl_url": f"https://ssd.jpl.nasa.gov/tools/sbdb_lookup.html#/?sstr={asteroid_id}",
+        "close_approach_data": [{"relative_velocity": {"kilometers_per_second": "17.4"}}],
+        "orbital_data": ORBITAL_DATA,
+    }
+
+def browse(page, size=20, total_pages=100):
+    """A NeoWs /neo/browse payload"""
+    start = 2000000 + page * size
+    return {"near_earth_objects": [neo(i) for i in range(start, start + size)],
+            "page": {"number": page, "size": size, "total_pages": total_pages}}
+
+def soilgrids(depths):
+    layers = [{"name": "bdod", "depths": [{"label": d, "values": {"mean": 130}} for d in depths]}]
+    return {"properties": {"layers": layers}}
+
+class StubResponse:
+    def __init__(self, payload, status_code=200):
+        self.payload = payload
+        self.status_code = status_code
+
+    def json(self):
+        return self.payload
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"{self.status_code} from stub")
+
+class StubUpstreams:
+    """
+    Callable replacement for requests.get.
+
+    Args:
+        latency_s: delay added to every call, or a {host fragment: delay} dict
+                   ('*' applies to hosts no other fragment matches)
+        error_rate: probability of answering 503 (or a {host fragment: rate} dict)
+        seed: random seed for error injection
+    """
+
+    def __init__(self, latency_s=0.0, error_rate=0.0, seed=0):
+        self.latency_s = latency_s
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.calls = {}
+
+    @staticmethod
+    def _for(setting, url):
+        if isinstance(setting, dict):
+            return next((value for host, value in setting.items() if host != '*' and host in url),
+                        setting.get('*', 0.0))
+        return setting
+
+    def __call__(self, url, params=None, timeout=None, **kwargs):
+        params = params or {}
+        host = url.split('/')[2] if '//' in url else url
+        self.calls[host] = self.calls.get(host, 0) + 1
+        delay = self._for(self.latency_s, url)
+        if delay:
+            time.sleep(delay)
+        if self.random.random() < self._for(self.error_rate, url):
+            return StubResponse({"error": "injected"}, 503)
+
+        if 'maps.googleapis.com' in url:
+            return StubResponse({"status": "OK", "results": [{"elevation": ELEVATION_M}]})
+        if 'soilgrids' in url:
+            depth = params.get('depth', [])
+            return StubResponse(soilgrids(depth if isinstance(depth, list) else [depth]))
+        if '/neo/browse' in url:
+            page = int(url.split('page=')[1].split('&')[0]) if 'page=' in url else int(params.get('page', 0))
+            return StubResponse(browse(page))
+        if '/neo/' in url:
+            asteroid_id = url.rsplit('/neo/', 1)[1].split('?')[0]
+            return StubResponse(neo(asteroid_id))
+        return StubResponse({"error": "unknown stub route"}, 404)
+
+@contextmanager
+def stub_upstreams(latency_s=0.0, error_rate=0.0, seed=0):
+    """Patch requests.get for the duration of the block, yielding the stub"""
+    stub = StubUpstreams(latency_s, error_rate, seed)
+    with mock.patch.object(requests, 'get', stub):
+        yield stub
+
+def write_synthetic_cities(path, count=40_000, seed=0):
+    """Deterministic cities_population.json-style dataset with log-normal populations"""
+    rng = np.random.default_rng(seed)
+    lat = rng.uniform(-56, 70, count)
+    lon = rng.uniform(-180, 180, count)
+    population = rng.lognormal(10.5, 1.2, count).astype(int)
+    cities = [{"id": i, "name": f"City {i}", "latitude": float(lat[i]), "longitude": float(lon[i]),
+               "population": int(population[i])} for i in range(count)]
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(cities, f)
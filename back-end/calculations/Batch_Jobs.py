@@ -0,0 +1,283 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from calculations.Coords_Info import get_densities, validate_coordinates
+from calculations.Impact_Pipeline import run_impact
+
+PARENT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+JOBS_DIR = os.getenv('JOBS_DIR', os.path.join(PARENT_DIR, "jobs"))
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', os.cpu_count() or 1))
+MAX_SCENARIOS = 10_000
+DEFAULT_ANGLE = 45
+STATUS_EVERY = 25             # completed scenarios between status file updates
+STREAM_POLL_S = 0.5
+STREAM_MAX_S = 3600            # a stream is closed after this long; clients reconnect or poll
+TERMINAL_STATUSES = ('completed', 'failed')
+JOB_RETENTION_S = float(os.getenv('JOB_RETENTION_DAYS', 7)) * 86400
+SWEEP_EVERY_S = 3600          # minimum time between retention sweeps of one server process
+
+STATUS_FILE = "status.json"
+RESULTS_FILE = "results.ndjson"
+
+_executor = None
+_executor_lock = threading.Lock()
+_last_sweep = 0.0
+_sweep_lock = threading.Lock()
+
+def executor():
+    """
+    Process pool shared by all jobs of this server process, started on first use.
+    Workers come from a forkserver rather than forking the (threaded) server
+    process, so they never inherit its locks, sockets or open datasets.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            context = multiprocessing.get_context('forkserver')
+            context.set_forkserver_preload(['calculations.Impact_Pipeline'])
+            _executor = ProcessPoolExecutor(max_workers=JOB_WORKERS, mp_context=context)
+        return _executor
+
+def expand_scenarios(payload):
+    """
+    Cross asteroids with impact locations.
+
+    Args:
+        payload: {'asteroids': [{'asteroid_id'} or {'diameter', 'velocity', 'mass'}],
+                  'locations': [{'latitude', 'longitude'}], 'angle': optional default}
+
+    Returns:
+        list: scenario dicts, each an asteroid entry plus 'angle', 'latitude', 'longitude'
+    """
+    asteroids = payload.get('asteroids') or []
+    locations = payload.get('locations') or []
+    if not isinstance(asteroids, list) or not isinstance(locations, list) or not asteroids or not locations:
+        raise ValueError("Both 'asteroids' and 'locations' must be non-empty lists")
+    if len(asteroids) * len(locations) > MAX_SCENARIOS:
+        raise ValueError(f"A job may contain at most {MAX_SCENARIOS} scenarios")
+
+    default_angle = float(payload.get('angle', DEFAULT_ANGLE))
+    for asteroid in asteroids:
+        if not isinstance(asteroid, dict):
+            raise ValueError("Each asteroid must be an object")
+        if 'asteroid_id' in asteroid and (isinstance(asteroid['asteroid_id'], bool)
+                                          or not isinstance(asteroid['asteroid_id'], (str, int))):
+            raise ValueError("'asteroid_id' must be a string or an integer")
+        if 'asteroid_id' not in asteroid and not all(k in asteroid for k in ('diameter', 'velocity', 'mass')):
+            raise ValueError("Each asteroid needs 'asteroid_id' or 'diameter', 'velocity' and 'mass'")
+    for location in locations:
+        if not isinstance(location, dict) or 'latitude' not in location or 'longitude' not in location:
+            raise ValueError("Each location needs 'latitude' and 'longitude'")
+
+    return [{**asteroid,
+             'angle': float(asteroid.get('angle', default_angle)),
+             'latitude': float(location['latitude']),
+             'longitude': float(location['longitude'])}
+            for asteroid in asteroids for location in locations]
+
+def run_scenario(scenario):
+    """Worker entry point: run the impact pipeline for one resolved scenario"""
+    return run_impact(float(scenario['velocity']), float(scenario['mass']), float(scenario['diameter']),
+                      scenario['angle'], scenario['latitude'], scenario['longitude'], scenario.get('ground_density'))
+
+def _job_dir(job_id):
+    if not job_id.isalnum():
+        raise KeyError(job_id)
+    return os.path.join(JOBS_DIR, job_id)
+
+def _write_status(job_id, status):
+    path = os.path.join(_job_dir(job_id), STATUS_FILE)
+    with open(path + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(status, f)
+    os.replace(path + ".tmp", path)
+
+def _run_job(job_id, scenarios, resolve_asteroid, status):
+    """Background thread body: any error ends the job as 'failed' rather than leaving it running"""
+    global _executor
+    try:
+        _execute_job(job_id, scenarios, resolve_asteroid, status)
+    except Exception as e:
+        if isinstance(e, BrokenProcessPool):
+            # A worker died; later jobs get a fresh pool
+            with _executor_lock:
+                _executor = None
+        status['status'] = 'failed'
+        status['error'] = f"{type(e).__name__}: {e}"
+        status['finished'] = time.time()
+        try:
+            _write_status(job_id, status)
+        except OSError:
+            pass  # nothing more can be recorded; job_status keeps the last written state
+
+def _execute_job(job_id, scenarios, resolve_asteroid, status):
+    status['status'] = 'running'
+    _write_status(job_id, status)
+
+    # NASA lookups happen once per asteroid id, not once per scenario
+    resolved = {}
+    for asteroid_id in {s['asteroid_id'] for s in scenarios if 'asteroid_id' in s}:
+        try:
+            resolved[asteroid_id] = resolve_asteroid(asteroid_id)
+        except Exception as e:
+            resolved[asteroid_id] = e
+
+    # Ground density once per distinct location, here rather than in each pool
+    # worker, which would repeat the SoilGrids and elevation lookups per scenario
+    densities, locations = {}, []
+    for location in dict.fromkeys((s['latitude'], s['longitude']) for s in scenarios):
+        try:
+            validate_coordinates(*location)
+            locations.append(location)
+        except ValueError as e:
+            densities[location] = e
+    if locations:
+        try:
+            densities.update(zip(locations, get_densities(*zip(*locations))))
+        except Exception as e:
+            densities.update(dict.fromkeys(locations, e))
+
+    with open(os.path.join(_job_dir(job_id), RESULTS_FILE), 'a', encoding='utf-8') as results:
+        def record(index, result=None, error=None):
+            line = {'index': index, 'scenario': scenarios[index]}
+            if error is None:
+                line['result'] = result
+            else:
+                line['error'] = error
+                status['failed'] += 1
+            results.write(json.dumps(line) + "\n")
+            status['completed'] += 1
+            if status['completed'] % STATUS_EVERY == 0:
+                results.flush()
+                _write_status(job_id, status)
+
+        futures = {}
+        for index, scenario in enumerate(scenarios):
+            params = scenario
+            if 'asteroid_id' in scenario:
+                properties = resolved[scenario['asteroid_id']]
+                if isinstance(properties, Exception) or properties is None:
+                    record(index, error=f"Could not resolve asteroid {scenario['asteroid_id']}")
+                    continue
+                params = {**properties, **scenario}
+            density = densities[(scenario['latitude'], scenario['longitude'])]
+            if isinstance(density, Exception):
+                record(index, error=str(density))
+                continue
+            futures[executor().submit(run_scenario, {**params, 'ground_density': density})] = index
+
+        for future in as_completed(futures):
+            try:
+                record(futures[future], result=future.result())
+            except Exception as e:
+                record(futures[future], error=str(e))
+
+    status['status'] = 'completed'
+    status['finished'] = time.time()
+    _write_status(job_id, status)
+
+def sweep_jobs(max_age_s=JOB_RETENTION_S):
+    """
+    Delete jobs whose status has not changed for max_age_s: finished jobs past
+    their retention, and jobs orphaned as 'running' by a server restart.
+
+    Returns:
+        int: number of job directories removed
+    """
+    cutoff = time.time() - max_age_s
+    removed = 0
+    try:
+        entries = list(os.scandir(JOBS_DIR))
+    except FileNotFoundError:
+        return 0
+    for entry in entries:
+        if not entry.is_dir() or not entry.name.isalnum():
+            continue
+        try:
+            updated = os.stat(os.path.join(entry.path, STATUS_FILE)).st_mtime
+        except FileNotFoundError:
+            updated = entry.stat().st_mtime
+        if updated < cutoff:
+            shutil.rmtree(entry.path, ignore_errors=True)
+            removed += 1
+    return removed
+
+def _maybe_sweep():
+    global _last_sweep
+    with _sweep_lock:
+        if _last_sweep and time.monotonic() - _last_sweep < SWEEP_EVERY_S:
+            return
+        _last_sweep = time.monotonic()
+    sweep_jobs()
+
+def submit_job(payload, resolve_asteroid):
+    """
+    Queue a scenario batch and run it in the background. Old jobs are swept
+    first (at most once per SWEEP_EVERY_S), see sweep_jobs.
+
+    Args:
+        payload: see expand_scenarios
+        resolve_asteroid: callable asteroid_id -> {'diameter', 'velocity', 'mass'} or None
+
+    Returns:
+        dict: initial job status
+    """
+    scenarios = expand_scenarios(payload)
+    _maybe_sweep()
+    job_id = uuid.uuid4().hex
+    os.makedirs(_job_dir(job_id))
+    status = {'job_id': job_id, 'status': 'queued', 'total': len(scenarios),
+              'completed': 0, 'failed': 0, 'created': time.time()}
+    _write_status(job_id, status)
+    threading.Thread(target=_run_job, args=(job_id, scenarios, resolve_asteroid, dict(status)), daemon=True).start()
+    return status
+
+def job_status(job_id):
+    """Current status of a job; raises KeyError for unknown ids"""
+    try:
+        with open(os.path.join(_job_dir(job_id), STATUS_FILE), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        raise KeyError(job_id)
+
+def job_results(job_id, offset=0, limit=100):
+    """Results offset..offset+limit in completion order"""
+    path = os.path.join(_job_dir(job_id), RESULTS_FILE)
+    if not os.path.exists(path):
+        return []
+    page = []
+    with open(path, encoding='utf-8') as f:
+        for n, line in enumerate(f):
+            if n >= offset + limit:
+                break
+            if n >= offset and line.endswith("\n"):
+                page.append(json.loads(line))
+    return page
+
+def stream_results(job_id):
+    """
+    Yield result lines as NDJSON while the job runs, ending when it completes
+    or fails, or after STREAM_MAX_S.
+    """
+    path = os.path.join(_job_dir(job_id), RESULTS_FILE)
+    position = 0
+    deadline = time.monotonic() + STREAM_MAX_S
+    while True:
+        done = job_status(job_id)['status'] in TERMINAL_STATUSES or time.monotonic() >= deadline
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                f.seek(position)
+                while True:
+                    line = f.readline()
+                    if not line.endswith("\n"):
+                        break
+                    position += len(line.encode('utf-8'))
+                    yield line
+        if done:
+            return
+        time.sleep(STREAM_POLL_S)
@@ -0,0 +1,306 @@
+import os
+import json
+import time
+import hashlib
+import argparse
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from calculations.Resilience import UpstreamRejected, UpstreamUnavailable, call_upstream, forget
+
+PARENT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+CATALOG_DIR = os.getenv('CATALOG_DIR', os.path.join(PARENT_DIR, "catalog"))
+NEOWS_URL = "https://api.nasa.gov/neo/rest/v1"
+INDEX_FILE = "index.json"
+OBJECTS_DIR = "objects"
+LOCK_FILE = "sync.lock"
+
+REFRESH_AGE_S = 7 * 86400     # objects not fetched for this long are re-checked
+REFRESH_PER_SYNC = 200        # oldest stale objects re-checked per run; the rest wait for the next
+PAGES_PER_SYNC = 50           # browse pages read per run; the cursor carries over
+PAGE_SIZE = 20                # NeoWs browse maximum
+SYNC_CONCURRENCY = 4
+# NASA API keys allow 1000 calls per hour
+RATE_PER_S = float(os.getenv('NASA_RATE_PER_S', 0.25))
+RELOAD_CHECK_S = 5            # how often readers look for a newer index
+LOCK_STALE_S = 900            # a lock not touched for this long belongs to a crashed run
+LOCK_HEARTBEAT_S = 60         # how often a running sync touches its lock
+DERIVED_MAX_ENTRIES = 4096    # derived results kept per process, least recently used dropped first
+
+class RateLimiter:
+    """Token bucket shared by the threads of one sync"""
+
+    def __init__(self, rate_per_s, burst=1):
+        self.interval = 1.0 / rate_per_s
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) / self.interval)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) * self.interval
+            time.sleep(wait)
+
+def digest(asteroid):
+    """Hash of the fields derived results are computed from"""
+    approaches = asteroid.get('close_approach_data') or []
+    inputs = [asteroid.get('orbital_data'), asteroid.get('estimated_diameter'),
+              approaches[0].get('relative_velocity') if approaches else None]
+    return hashlib.sha1(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+class Catalog:
+    """
+    Local copy of NeoWs objects: one JSON file per object plus an index of
+    orbit_determination_date, fetch timestamp and a version number that
+    increases whenever the fields derived results depend on change.
+    """
+
+    def __init__(self, directory=CATALOG_DIR):
+        self.directory = directory
+        self.index_path = os.path.join(directory, INDEX_FILE)
+        self.mtime = None
+        self.index = {'objects': {}, 'next_page': 0, 'last_sync': None}
+        if os.path.exists(self.index_path):
+            self.mtime = os.stat(self.index_path).st_mtime_ns
+            with open(self.index_path, encoding='utf-8') as f:
+                self.index = json.load(f)
+
+    def __contains__(self, asteroid_id):
+        return str(asteroid_id) in self.index['objects']
+
+    def __len__(self):
+        return len(self.index['objects'])
+
+    def _object_path(self, asteroid_id):
+        if not str(asteroid_id).isalnum():
+            raise KeyError(asteroid_id)
+        return os.path.join(self.directory, OBJECTS_DIR, f"{asteroid_id}.json")
+
+    def version(self, asteroid_id):
+        entry = self.index['objects'].get(str(asteroid_id))
+        return entry['version'] if entry else None
+
+    def get(self, asteroid_id):
+        """Stored NeoWs object, or None"""
+        if asteroid_id not in self:
+            return None
+        try:
+            with open(self._object_path(asteroid_id), encoding='utf-8') as f:
+                return json.load(f)
+        except (KeyError, OSError, ValueError):
+            return None
+
+    def put(self, asteroid, fetched_at=None):
+        """
+        Store a NeoWs object. Returns True when it is new or changed (new orbit
+        determination, diameter or approach velocity), which bumps its version.
+        """
+        asteroid_id = str(asteroid['id'])
+        entry = self.index['objects'].get(asteroid_id)
+        current = digest(asteroid)
+        changed = entry is None or entry['digest'] != current
+        if changed:
+            path = self._object_path(asteroid_id)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path + ".tmp", 'w', encoding='utf-8') as f:
+                json.dump(asteroid, f)
+            os.replace(path + ".tmp", path)
+        self.index['objects'][asteroid_id] = {
+            'orbit_determination_date': (asteroid.get('orbital_data') or {}).get('orbit_determination_date'),
+            'fetched_at': fetched_at or time.time(),
+            'digest': current,
+            'version': (entry['version'] + 1 if entry else 1) if changed else entry['version'],
+        }
+        return changed
+
+    def stale_ids(self, max_age_s=REFRESH_AGE_S, now=None):
+        """Ids not fetched for max_age_s, oldest first"""
+        cutoff = (now or time.time()) - max_age_s
+        stale = [(entry['fetched_at'], asteroid_id) for asteroid_id, entry in self.index['objects'].items()
+                 if entry['fetched_at'] < cutoff]
+        return [asteroid_id for _, asteroid_id in sorted(stale)]
+
+    def save(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.index_path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump(self.index, f)
+        os.replace(self.index_path + ".tmp", self.index_path)
+        self.mtime = os.stat(self.index_path).st_mtime_ns
+
+_catalog = None
+_checked_at = 0.0
+_catalog_lock = threading.Lock()
+
+def catalog():
+    """Shared catalog, reloaded when another process (e.g. a sync) replaced the index"""
+    global _catalog, _checked_at
+    with _catalog_lock:
+        now = time.monotonic()
+        if _catalog is None:
+            _catalog, _checked_at = Catalog(), now
+        elif now - _checked_at >= RELOAD_CHECK_S:
+            _checked_at = now
+            path = os.path.join(CATALOG_DIR, INDEX_FILE)
+            if os.path.exists(path) and os.stat(path).st_mtime_ns != _catalog.mtime:
+                _catalog = Catalog()
+        return _catalog
+
+# --------------------- Derived results --------------------- #
+_derived = OrderedDict()
+_derived_lock = threading.Lock()
+
+def derived(asteroid_id, kind, compute):
+    """
+    Memoize a result computed from a catalogued object (orbit path, energies...)
+    until that object's version changes, keeping the DERIVED_MAX_ENTRIES most
+    recently used. Objects outside the catalog are not memoized.
+    """
+    version = catalog().version(asteroid_id)
+    if version is None:
+        return compute()
+    key = (str(asteroid_id), kind)
+    with _derived_lock:
+        entry = _derived.get(key)
+        if entry is not None:
+            _derived.move_to_end(key)
+    if entry is not None and entry[0] == version:
+        return entry[1]
+    value = compute()
+    with _derived_lock:
+        _derived[key] = (version, value)
+        _derived.move_to_end(key)
+        while len(_derived) > DERIVED_MAX_ENTRIES:
+            _derived.popitem(last=False)
+    return value
+
+def invalidate(asteroid_ids):
+    """Drop derived results and cached NeoWs answers for the given ids only"""
+    ids = {str(i) for i in asteroid_ids}
+    with _derived_lock:
+        for key in [key for key in _derived if key[0] in ids]:
+            del _derived[key]
+    for asteroid_id in ids:
+        forget('nasa_neows', f"neo/{asteroid_id}")
+
+# --------------------- Sync --------------------- #
+def _neows(path):
+    """Fresh (uncached) NeoWs GET through the sync's own circuit breaker"""
+    api_key = os.getenv('NASA_API_KEY')
+    if not api_key:
+        raise ValueError("NASA_API_KEY not found in environment variables.")
+    separator = '&' if '?' in path else '?'
+    url = f"{NEOWS_URL}/{path}{separator}api_key={api_key}"
+    return call_upstream('nasa_neows_sync', lambda timeout: requests.get(url, timeout=timeout))
+
+def _acquire_lock(directory):
+    path = os.path.join(directory, LOCK_FILE)
+    os.makedirs(directory, exist_ok=True)
+    if os.path.exists(path) and time.time() - os.stat(path).st_mtime > LOCK_STALE_S:
+        os.remove(path)
+    try:
+        os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        return path
+    except FileExistsError:
+        return None
+
+def _heartbeat(lock, stop):
+    """Touch the lock while a sync runs, so it is never taken for a crashed run's"""
+    while not stop.wait(LOCK_HEARTBEAT_S):
+        try:
+            os.utime(lock)
+        except OSError:
+            return
+
+def sync_catalog(pages=PAGES_PER_SYNC, max_age_s=REFRESH_AGE_S, concurrency=SYNC_CONCURRENCY,
+                 rate_per_s=RATE_PER_S, directory=CATALOG_DIR, refresh_limit=REFRESH_PER_SYNC):
+    """
+    One incremental sync run.
+
+    1. Read the next `pages` browse pages (continuing from the stored cursor)
+       and store new objects or ones whose orbit_determination_date changed.
+    2. Re-fetch the refresh_limit oldest objects not fetched for max_age_s,
+       `concurrency` at a time, all calls sharing one rate limit.
+    3. Invalidate derived results of changed ids only.
+
+    Returns:
+        dict: run summary, also stored as the index's 'last_sync'
+    """
+    lock = _acquire_lock(directory)
+    if lock is None:
+        raise RuntimeError("A catalog sync is already running")
+    stop = threading.Event()
+    threading.Thread(target=_heartbeat, args=(lock, stop), name='catalog-sync-lock', daemon=True).start()
+    try:
+        store = Catalog(directory)
+        limiter = RateLimiter(rate_per_s)
+        started = time.time()
+        changed, failed = set(), []
+        seen = set()
+        page = store.index.get('next_page', 0)
+        pages_read = 0
+
+        for _ in range(pages):
+            limiter.acquire()
+            try:
+                data = _neows(f"neo/browse?page={page}&size={PAGE_SIZE}")
+            except (UpstreamUnavailable, UpstreamRejected) as e:
+                failed.append(f"browse page {page}: {e}")
+                break
+            for asteroid in data.get('near_earth_objects', []):
+                if asteroid.get('orbital_data') and store.put(asteroid, started):
+                    changed.add(str(asteroid['id']))
+                seen.add(str(asteroid['id']))
+            pages_read += 1
+            total_pages = (data.get('page') or {}).get('total_pages')
+            page = page + 1 if total_pages is None or page + 1 < total_pages else 0
+
+        store.index['next_page'] = page
+        stale = [i for i in store.stale_ids(max_age_s, started) if i not in seen][:refresh_limit]
+
+        def refresh(asteroid_id):
+            limiter.acquire()
+            return asteroid_id, _neows(f"neo/{asteroid_id}")
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            futures = [pool.submit(refresh, asteroid_id) for asteroid_id in stale]
+            for future in futures:
+                try:
+                    asteroid_id, asteroid = future.result()
+                except (UpstreamUnavailable, UpstreamRejected) as e:
+                    failed.append(str(e))
+                    continue
+                if store.put(asteroid, started):
+                    changed.add(asteroid_id)
+
+        summary = {'started': started, 'finished': time.time(), 'pages': pages_read, 'next_page': page,
+                   'refreshed': len(stale), 'changed': len(changed), 'failed': failed[:20],
+                   'objects': len(store)}
+        store.index['last_sync'] = summary
+        store.save()
+        invalidate(changed)
+        return {**summary, 'changed_ids': sorted(changed)}
+    finally:
+        stop.set()
+        os.remove(lock)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Incrementally sync the local NeoWs catalog")
+    parser.add_argument('--pages', type=int, default=PAGES_PER_SYNC)
+    parser.add_argument('--max-age-days', type=float, default=REFRESH_AGE_S / 86400)
+    parser.add_argument('--refresh', type=int, default=REFRESH_PER_SYNC, help="stale objects re-checked per run")
+    parser.add_argument('--concurrency', type=int, default=SYNC_CONCURRENCY)
+    parser.add_argument('--rate', type=float, default=RATE_PER_S, help="NASA calls per second")
+    args = parser.parse_args()
+    result = sync_catalog(args.pages, args.max_age_days * 86400, args.concurrency, args.rate,
+                          refresh_limit=args.refresh)
+    print(f"{result['pages']} pages, {result['refreshed']} refreshed, {result['changed']} changed, "
+          f"{len(result['failed'])} failures; {result['objects']} objects catalogued")
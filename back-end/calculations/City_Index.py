@@ -0,0 +1,135 @@
+import os
+import json
+from functools import lru_cache
+import numpy as np
+from calculations.Dataset_Store import RecordTable, compiled, pack_records
+from calculations.Geometry import bounding_box, great_circle_distance, unit_vectors
+
+PARENT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+CITIES_POPULATION_FILE = os.path.join(PARENT_DIR, "cities_population.json")
+CELL_DEG = 1.0
+
+class PointIndex:
+    """
+    Points bucketed into lat/lon cells for radius queries.
+
+    Points are sorted by cell key (row * cols + col) so every grid row of a
+    query box is one contiguous slice; only those candidates get an exact
+    great-circle distance check. order/keys may be passed in precomputed
+    (e.g. memory-mapped from Dataset_Store) to skip the sort.
+    """
+
+    def __init__(self, lat, lon, cell_deg=CELL_DEG, order=None, keys=None):
+        self.cell_deg = cell_deg
+        self.lat = np.asarray(lat, dtype=float)
+        self.lon = np.asarray(lon, dtype=float)
+        self.rows = int(np.ceil(180 / cell_deg))
+        self.cols = int(np.ceil(360 / cell_deg))
+        if order is None or keys is None:
+            keys = self._row(self.lat) * self.cols + self._col(self.lon)
+            order = np.argsort(keys, kind='stable')
+            keys = keys[order]
+        self.order = order
+        self.keys = keys
+
+    def __len__(self):
+        return len(self.lat)
+
+    def arrays(self):
+        """Arrays that fully describe the index, for Dataset_Store.compiled()"""
+        return {'lat': self.lat, 'lon': self.lon, 'order': self.order, 'keys': self.keys}
+
+    def _row(self, lat):
+        return np.clip(((np.asarray(lat) + 90) // self.cell_deg).astype(int), 0, self.rows - 1)
+
+    def _col(self, lon):
+        return ((np.asarray(lon) + 180) // self.cell_deg).astype(int) % self.cols
+
+    def _candidates(self, lat, lon, radius_km):
+        """Indices of points in the cells overlapping the query's bounding box"""
+        south, north, west, east = bounding_box(lat, lon, radius_km)
+        row_lo, row_hi = self._row(south), self._row(north)
+
+        if east - west >= 360:
+            spans = [(row_lo * self.cols, row_hi * self.cols + self.cols - 1)]
+        else:
+            col_lo, col_hi = int(self._col(west)), int(self._col(east))
+            spans = []
+            for row in range(row_lo, row_hi + 1):
+                base = row * self.cols
+                if col_lo <= col_hi:
+                    spans.append((base + col_lo, base + col_hi))
+                else:
+                    spans.append((base, base + col_hi))
+                    spans.append((base + col_lo, base + self.cols - 1))
+
+        slices = [self.order[np.searchsorted(self.keys, lo, 'left'):np.searchsorted(self.keys, hi, 'right')]
+                  for lo, hi in spans]
+        return np.concatenate(slices) if slices else np.empty(0, dtype=int)
+
+    def query_ring(self, lat, lon, inner_km, outer_km):
+        """
+        Points whose distance from (lat, lon) lies in (inner_km, outer_km].
+
+        Returns:
+            tuple: (indices sorted ascending, distances in km)
+        """
+        idx = self._candidates(lat, lon, outer_km)
+        dist = great_circle_distance(lat, lon, self.lat[idx], self.lon[idx])
+        keep = (dist <= outer_km) & (dist > inner_km)
+        idx, dist = idx[keep], dist[keep]
+        sort = np.argsort(idx)
+        return idx[sort], dist[sort]
+
+    def query_radius(self, lat, lon, radius_km):
+        """Points within radius_km, as (indices sorted ascending, distances in km)"""
+        return self.query_ring(lat, lon, -1.0, radius_km)
+
+    def nearest_distance(self, lat, lon, max_km):
+        """Distance in km to the closest point within max_km, or None"""
+        _, dist = self.query_radius(lat, lon, max_km)
+        return float(dist.min()) if len(dist) else None
+
+class CityIndex(PointIndex):
+    """
+    PointIndex over city records, keeping their populations and unit vectors.
+    arrays may hold precomputed lat/lon/order/keys/population/xyz.
+    """
+
+    def __init__(self, cities, cell_deg=CELL_DEG, **arrays):
+        if 'lat' in arrays:
+            lat, lon = arrays['lat'], arrays['lon']
+        else:
+            lat, lon = [c['latitude'] for c in cities], [c['longitude'] for c in cities]
+        super().__init__(lat, lon, cell_deg, arrays.get('order'), arrays.get('keys'))
+        self.cities = cities
+        if 'population' in arrays:
+            self.population = arrays['population']
+        else:
+            self.population = np.array([c.get('population') or 0 for c in cities], dtype=float)
+        self.xyz = arrays['xyz'] if 'xyz' in arrays else unit_vectors(self.lat, self.lon)
+
+    def arrays(self):
+        return {**super().arrays(), 'population': self.population, 'xyz': self.xyz}
+
+    @classmethod
+    def from_file(cls, path=CITIES_POPULATION_FILE):
+        """
+        Index over a cities JSON file. The records and index arrays are compiled
+        once into memory-mapped files, so workers share them instead of each
+        parsing the JSON.
+        """
+        def build():
+            with open(path, "r", encoding="utf-8") as f:
+                cities = json.load(f)
+            records, offsets = pack_records(cities)
+            return {**cls(cities).arrays(), 'records': records, 'record_offsets': offsets}
+
+        arrays = compiled('cities', [path], build)
+        cities = RecordTable(arrays.pop('records'), arrays.pop('record_offsets'))
+        return cls(cities, **arrays)
+
+@lru_cache(maxsize=1)
+def city_index():
+    """Shared index over cities_population.json, built on first use"""
+    return CityIndex.from_file(CITIES_POPULATION_FILE)
@@ -0,0 +1,240 @@
+from datetime import datetime, timedelta
+import numpy as np
+
+AU_KM = 149_597_870.7
+LUNAR_DISTANCE_AU = 384_400 / AU_KM
+J2000_JD = 2451545.0
+J2000 = datetime(2000, 1, 1, 12)
+KEPLER_TOLERANCE = 1e-12
+KEPLER_ITERATIONS = 50
+
+# Earth-Moon barycentre mean elements at J2000 (Standish, JPL), heliocentric ecliptic
+EARTH = {
+    'a': np.array([1.00000261]),
+    'e': np.array([0.01671123]),
+    'i': np.radians([-0.00001531]),
+    'node': np.array([0.0]),
+    'peri': np.radians([102.93768193]),
+    'M0': np.radians([100.46457166 - 102.93768193]),
+    'n': np.radians([0.9856076686]),
+    'epoch': np.array([J2000_JD]),
+}
+
+MOID_SAMPLES = (360, 180)     # coarse eccentric-anomaly grid: object, Earth
+MOID_REFINEMENTS = 4          # each narrows the search window five-fold
+MOID_CHUNK = 64               # objects per coarse distance block
+APPROACH_CHUNK_POINTS = 2_000_000  # object-epoch pairs per propagation block
+
+def julian_date(moment):
+    """Julian date of a naive UTC datetime"""
+    return J2000_JD + (moment - J2000).total_seconds() / 86400.0
+
+def calendar_date(jd):
+    return J2000 + timedelta(days=float(jd - J2000_JD))
+
+def elements(orbital_data):
+    """
+    Element arrays from NeoWs 'orbital_data' dicts (semi-major axis in AU, angles
+    in degrees, mean motion in degrees/day). The mean anomaly epoch is
+    epoch_osculation when present, else orbit_determination_date.
+
+    Returns:
+        dict: arrays a, e, i, node, peri, M0, n (radians, rad/day) and epoch (JD)
+    """
+    def epoch(data):
+        if data.get('epoch_osculation'):
+            return float(data['epoch_osculation'])
+        return julian_date(datetime.strptime(data['orbit_determination_date'], '%Y-%m-%d %H:%M:%S'))
+
+    def column(key):
+        return np.array([float(data[key]) for data in orbital_data])
+
+    return {
+        'a': column('semi_major_axis'),
+        'e': column('eccentricity'),
+        'i': np.radians(column('inclination')),
+        'node': np.radians(column('ascending_node_longitude')),
+        'peri': np.radians(column('perihelion_argument')),
+        'M0': np.radians(column('mean_anomaly')),
+        'n': np.radians(column('mean_motion')),
+        'epoch': np.array([epoch(data) for data in orbital_data]),
+    }
+
+def subset(el, idx):
+    return {key: value[idx] for key, value in el.items()}
+
+def _basis(el):
+    """Perifocal unit vectors P (to perihelion) and Q, each (n, 3)"""
+    cos_node, sin_node = np.cos(el['node']), np.sin(el['node'])
+    cos_peri, sin_peri = np.cos(el['peri']), np.sin(el['peri'])
+    cos_i, sin_i = np.cos(el['i']), np.sin(el['i'])
+    P = np.column_stack([cos_node * cos_peri - sin_node * sin_peri * cos_i,
+                         sin_node * cos_peri + cos_node * sin_peri * cos_i,
+                         sin_peri * sin_i])
+    Q = np.column_stack([-cos_node * sin_peri - sin_node * cos_peri * cos_i,
+                         -sin_node * sin_peri + cos_node * cos_peri * cos_i,
+                         cos_peri * sin_i])
+    return P, Q
+
+def orbit_points(el, E):
+    """
+    Heliocentric positions (AU) at eccentric anomalies E.
+
+    Args:
+        E: (k,) shared by every object, or (n, k) per object
+
+    Returns:
+        ndarray: (n, k, 3)
+    """
+    P, Q = _basis(el)
+    a, e = el['a'][:, None], el['e'][:, None]
+    x = a * (np.cos(E) - e)
+    y = a * np.sqrt(1 - e**2) * np.sin(E)
+    return x[..., None] * P[:, None, :] + y[..., None] * Q[:, None, :]
+
+def solve_kepler(M, e):
+    """Eccentric anomaly for mean anomalies M (any shape) by vectorized Newton iteration"""
+    M = np.remainder(M, 2 * np.pi)
+    E = np.where(e < 0.8, M, np.pi)
+    for _ in range(KEPLER_ITERATIONS):
+        step = (E - e * np.sin(E) - M) / (1 - e * np.cos(E))
+        E = E - step
+        if np.max(np.abs(step), initial=0) < KEPLER_TOLERANCE:
+            break
+    return E
+
+def positions(el, jd):
+    """
+    Two-body heliocentric positions (AU).
+
+    Args:
+        jd: (t,) epochs shared by every object, or (n, t) per object
+
+    Returns:
+        ndarray: (n, t, 3)
+    """
+    M = el['M0'][:, None] + el['n'][:, None] * (jd - el['epoch'][:, None])
+    return orbit_points(el, solve_kepler(M, el['e'][:, None]))
+
+def moid(el, earth=EARTH):
+    """
+    Minimum orbit intersection distance with Earth's orbit, vectorized over objects.
+
+    Both orbits are sampled on a coarse eccentric-anomaly grid (distances via
+    |a|² + |b|² - 2a·b as one matrix product per block), then the best pair of
+    each object is refined on successively narrower local grids.
+
+    Returns:
+        ndarray: MOID in AU per object
+    """
+    n_objects = len(el['a'])
+    result = np.empty(n_objects)
+    grid_a = np.linspace(0, 2 * np.pi, MOID_SAMPLES[0], endpoint=False)
+    grid_e = np.linspace(0, 2 * np.pi, MOID_SAMPLES[1], endpoint=False)
+    earth_points = orbit_points(earth, grid_e)[0]
+    earth_sq = (earth_points**2).sum(axis=1)
+    window = np.linspace(-1, 1, 11)
+
+    for start in range(0, n_objects, MOID_CHUNK):
+        chunk = subset(el, slice(start, start + MOID_CHUNK))
+        points = orbit_points(chunk, grid_a)
+        d2 = (points**2).sum(axis=2)[:, :, None] + earth_sq - 2 * points @ earth_points.T
+        best = d2.reshape(len(points), -1).argmin(axis=1)
+        Ea, Ee = grid_a[best // len(grid_e)], grid_e[best % len(grid_e)]
+        step_a, step_e = 2 * np.pi / len(grid_a), 2 * np.pi / len(grid_e)
+
+        for _ in range(MOID_REFINEMENTS):
+            Ea_grid = Ea[:, None] + step_a * window
+            Ee_grid = Ee[:, None] + step_e * window
+            pa = orbit_points(chunk, Ea_grid)
+            pe = orbit_points(earth, Ee_grid)
+            d2 = ((pa[:, :, None, :] - pe[:, None, :, :])**2).sum(axis=3)
+            best = d2.reshape(len(pa), -1).argmin(axis=1)
+            rows = np.arange(len(pa))
+            Ea, Ee = Ea_grid[rows, best // len(window)], Ee_grid[rows, best % len(window)]
+            step_a, step_e = step_a / 5, step_e / 5
+        result[start:start + len(points)] = np.sqrt(np.maximum(d2.reshape(len(pa), -1).min(axis=1), 0))
+    return result
+
+def closest_approaches(el, jd_start, days, step_days=1.0, earth=EARTH):
+    """
+    Closest approach to Earth of every object within [jd_start, jd_start + days].
+
+    Distances are scanned on a step_days grid, then each object's minimum is
+    refined on an hourly grid spanning the neighbouring steps.
+
+    Returns:
+        tuple: (JD of closest approach, distance in AU, relative speed in km/s), one per object
+    """
+    epochs = jd_start + np.arange(0, days + step_days, step_days)
+    earth_track = positions(earth, epochs)[0]
+    n_objects = len(el['a'])
+    times, distances, speeds = np.empty(n_objects), np.empty(n_objects), np.empty(n_objects)
+    chunk_size = max(1, APPROACH_CHUNK_POINTS // len(epochs))
+    span = int(np.ceil(24 * step_days))
+    hours = np.arange(-span, span + 1) / 24.0   # centred on the coarse minimum
+
+    for start in range(0, n_objects, chunk_size):
+        chunk = subset(el, slice(start, start + chunk_size))
+        gap = np.linalg.norm(positions(chunk, epochs) - earth_track, axis=2)
+        t0 = epochs[gap.argmin(axis=1)]
+
+        fine = np.clip(t0[:, None] + hours, epochs[0], epochs[-1])
+        relative = positions(chunk, fine) - positions(earth, fine)
+        gap = np.linalg.norm(relative, axis=2)
+        best = gap.argmin(axis=1)
+        rows = np.arange(len(gap))
+        stop = slice(start, start + len(gap))
+        times[stop] = fine[rows, best]
+        distances[stop] = gap[rows, best]
+
+        # Relative speed from a central difference of the relative position
+        dt = 1 / 24.0
+        ahead = positions(chunk, times[stop][:, None] + dt) - positions(earth, times[stop][:, None] + dt)
+        behind = positions(chunk, times[stop][:, None] - dt) - positions(earth, times[stop][:, None] - dt)
+        speeds[stop] = np.linalg.norm(ahead - behind, axis=2)[:, 0] / (2 * dt) * AU_KM / 86400
+    return times, distances, speeds
+
+def screen(objects, start, days=365, step_days=1.0, limit=None):
+    """
+    Rank objects by how close they pass Earth within a time window.
+
+    Args:
+        objects: [{'id', 'name', 'orbital_data'}] with NeoWs-style orbital_data
+        start: datetime opening the window
+        days: window length
+        step_days: coarse scan step
+        limit: keep only the closest this many
+
+    Returns:
+        tuple: (ranked approach dicts, ids skipped because their orbit is not closed or incomplete)
+    """
+    usable, skipped = [], []
+    for obj in objects:
+        data = obj.get('orbital_data') or {}
+        try:
+            if float(data['eccentricity']) < 1 and float(data['semi_major_axis']) > 0:
+                usable.append(obj)
+                continue
+        except (KeyError, TypeError, ValueError):
+            pass
+        skipped.append(obj.get('id'))
+    if not usable:
+        return [], skipped
+
+    el = elements([obj['orbital_data'] for obj in usable])
+    moids = moid(el)
+    times, distances, speeds = closest_approaches(el, julian_date(start), days, step_days)
+    ranked = []
+    for k in np.argsort(distances)[:limit]:
+        ranked.append({
+            'id': usable[k].get('id'),
+            'name': usable[k].get('name'),
+            'moid_au': float(moids[k]),
+            'moid_ld': float(moids[k] / LUNAR_DISTANCE_AU),
+            'approach_time': calendar_date(times[k]).strftime('%Y-%m-%d %H:%M'),
+            'approach_distance_au': float(distances[k]),
+            'approach_distance_ld': float(distances[k] / LUNAR_DISTANCE_AU),
+            'relative_velocity_km_s': float(speeds[k]),
+        })
+    return ranked, skipped
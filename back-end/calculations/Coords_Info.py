@@ -1,50 +1,53 @@
 import os
 import csv
 import requests
-from math import radians, cos, sin, asin, sqrt
 from dotenv import load_dotenv
-from time import sleep
+from functools import lru_cache
+import numpy as np
+from calculations.Dataset_Store import StringTable, compiled, pack_strings
+from calculations.Geometry import within_radius
+from calculations.Metrics import stage
+from calculations.Resilience import UpstreamError, call_upstream
+from calculations.Soil_Profile import DEPTH_RANGES, fetch_profile, fetch_profiles
+from calculations.Soil_Raster import soil_raster
+from calculations.Zone_Model import is_coastal
 
 load_dotenv()
 
 CITIES_FILE = "cities_filtered.csv"
 MIN_POPULATION = 400_000
-SOILGRIDS_URL = "https://rest.isric.org/soilgrids/v2.0/properties/query"
-DEPTH_RANGES = ['0-5cm', '5-15cm', '15-30cm', '30-60cm', '60-100cm', '100-200cm']
-
-GOOGLE_MAPS_API_KEY = os.getenv('GOOGLE_MAPS_API_KEY')
-if not GOOGLE_MAPS_API_KEY:
-    raise ValueError("GOOGLE_MAPS_API_KEY not found in environment variables.")
+# 'soilgrids' queries the live API (the offline raster only backs up failures);
+# 'raster' answers from the offline raster without any network calls
+GROUND_DENSITY_SOURCE = os.getenv('GROUND_DENSITY_SOURCE', 'soilgrids')
 
 GREENLAND_BOUNDS = {'lat_min': 59.0, 'lat_max': 84.0, 'lon_min': -75.0, 'lon_max': -10.0}
 ANTARCTICA_BOUNDS = {'lat_min': -90.0, 'lat_max': -60.0, 'lon_min': -180.0, 'lon_max': 180.0}
 
+def google_maps_api_key():
+    api_key = os.getenv('GOOGLE_MAPS_API_KEY')
+    if not api_key:
+        raise ValueError("GOOGLE_MAPS_API_KEY not found in environment variables.")
+    return api_key
+
 def validate_coordinates(lat, lon):
     if not (-90 <= lat <= 90):
         raise ValueError(f"Latitude {lat} out of range")
     if not (-180 <= lon <= 180):
         raise ValueError(f"Longitude {lon} out of range")
 
-def haversine(lat1, lon1, lat2, lon2):
-    lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
-    dlat = lat2 - lat1
-    dlon = lon2 - lon1
-    a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-    return 6371 * 2 * asin(sqrt(a))
+def _parse_elevation(response):
+    data = response.json()
+    if data.get('status') != 'OK' or not data.get('results'):
+        raise UpstreamError(f"Elevation API status {data.get('status')}")
+    return data['results'][0]['elevation'] <= 1
 
 def is_water(lat, lon):
+    """True/False from the elevation API, or None when it cannot be reached (callers treat None as land)"""
     validate_coordinates(lat, lon)
     url = "https://maps.googleapis.com/maps/api/elevation/json"
-    params = {'locations': f"{lat},{lon}", 'key': GOOGLE_MAPS_API_KEY}
-    try:
-        response = requests.get(url, params=params, timeout=10)
-        data = response.json()
-        if data.get('status') == 'OK' and data.get('results'):
-            elevation = data['results'][0]['elevation']
-            return elevation <= 1
-    except:
-        return None
-    return None
+    params = {'locations': f"{lat},{lon}", 'key': google_maps_api_key()}
+    return call_upstream('google_elevation', lambda timeout: requests.get(url, params=params, timeout=timeout),
+                         _parse_elevation, key=(round(lat, 4), round(lon, 4)), fallback=lambda: None)
 
 def is_greenland(lat, lon):
     validate_coordinates(lat, lon)
@@ -58,71 +61,128 @@ def is_antarctica(lat, lon):
 def get_location_type(lat, lon):
     if is_antarctica(lat, lon): return 'antarctica'
     if is_greenland(lat, lon): return 'greenland'
+    if is_coastal(lat, lon): return 'coastal'
     water = is_water(lat, lon)
     return 'water' if water else 'land'
 
-def nearby_cities(lat, lon, radius_km=5):
-    validate_coordinates(lat, lon)
-    parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-    cities_file = os.path.join(parent_dir, "cities_filtered.csv")
-    if not os.path.exists(cities_file):
-        return []
-    cities = []
-    with open(cities_file, encoding='utf-8') as f:
-        reader = csv.reader(f)
-        for row in reader:
+def _read_large_cities(cities_file):
+    names, lats, lons = [], [], []
+    with stage('cities_csv_scan'), open(cities_file, encoding='utf-8') as f:
+        for row in csv.reader(f):
             try:
                 name = row[1]
                 city_lat = float(row[4])
                 city_lon = float(row[5])
                 population = int(row[14].replace(",", ""))
-                if population < MIN_POPULATION:
-                    continue
-                dist = haversine(lat, lon, city_lat, city_lon)
-                if dist <= radius_km:
-                    cities.append(name)
-            except: 
+            except (IndexError, ValueError):
+                continue
+            if population < MIN_POPULATION:
                 continue
-    return cities
+            names.append(name)
+            lats.append(city_lat)
+            lons.append(city_lon)
+    blob, offsets = pack_strings(names)
+    return {'names': blob, 'name_offsets': offsets,
+            'lat': np.array(lats, dtype=float), 'lon': np.array(lons, dtype=float)}
+
+@lru_cache(maxsize=1)
+def large_cities():
+    """
+    (names, lat, lon) of cities in cities_filtered.csv above MIN_POPULATION.
+    The CSV is compiled once into memory-mapped arrays shared by all workers.
+    """
+    parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    cities_file = os.path.join(parent_dir, CITIES_FILE)
+    if not os.path.exists(cities_file):
+        return StringTable(*pack_strings([])), np.empty(0), np.empty(0)
+    arrays = compiled('large_cities', [cities_file], lambda: _read_large_cities(cities_file))
+    return StringTable(arrays['names'], arrays['name_offsets']), arrays['lat'], arrays['lon']
+
+def nearby_cities(lat, lon, radius_km=5):
+    validate_coordinates(lat, lon)
+    names, city_lat, city_lon = large_cities()
+    within, _ = within_radius(lat, lon, radius_km, city_lat, city_lon)
+    return [names[i] for i in within]
 
-def soil_bulk_density(lat, lon):
+def soil_bulk_density(lat, lon, depths=DEPTH_RANGES, profile=None):
+    """
+    SoilGrids bulk density in kg/m³ for the requested depths, from one query
+    (or from a profile already fetched with fetch_profiles).
+    A depth without data takes the last valid shallower value (None if there is none).
+    """
     validate_coordinates(lat, lon)
+    if profile is None:
+        profile = fetch_profile(lat, lon, depths)[0]
+    if np.isnan(profile).all() and soil_raster() is not None:
+        profile = soil_raster().sample(lat, lon, depths)[0]
+    return _fill_depths(depths, profile)
+
+def _fill_depths(depths, profile):
     densities = {}
     last_valid = None
-    for depth in DEPTH_RANGES:
-        params = {'lon': lon, 'lat': lat, 'property': 'bdod', 'depth': depth, 'value': 'mean'}
-        try:
-            response = requests.get(SOILGRIDS_URL, params=params, timeout=10)
-            if response.status_code == 429:
-                sleep(0.5)
-                continue
-            response.raise_for_status()
-            data = response.json()
-            mean_val = None
-            if 'properties' in data and 'layers' in data['properties']:
-                for layer in data['properties']['layers']:
-                    if layer.get('name') == 'bdod':
-                        for d in layer.get('depths', []):
-                            if d['label'] == depth:
-                                mean_val = d['values'].get('mean')
-                                break
-            if mean_val is not None:
-                densities[depth] = mean_val * 10  # SoilGrids cg/cm³ -> kg/m³
-                last_valid = densities[depth]
-            else:
-                densities[depth] = last_valid
-        except:
-            densities[depth] = last_valid
+    for depth, value in zip(depths, profile):
+        if not np.isnan(value):
+            last_valid = float(value)
+        densities[depth] = last_valid
     return densities
 
-def get_density(lat, lon, radius_km=5):
+def get_density(lat, lon, radius_km=5, depths=DEPTH_RANGES):
+    """Ground density in kg/m³ per depth; pass only the depths you need to keep the SoilGrids query small"""
+    with stage('ground_density'):
+        return _get_density(lat, lon, radius_km, depths)
+
+def get_densities(lat, lon, radius_km=5, depths=DEPTH_RANGES):
+    """
+    get_density for many points, each distinct point resolved once. The
+    SoilGrids profiles of all open-land points come from one fetch_profiles call.
+
+    Returns:
+        list: density dict per point, in input order
+    """
+    with stage('ground_density'):
+        points = list(zip(lat, lon))
+        unique = list(dict.fromkeys(points))
+        if GROUND_DENSITY_SOURCE == 'raster' and soil_raster() is not None:
+            resolved = {p: _offline_density(*p, radius_km, depths) for p in unique}
+        else:
+            resolved = {p: _fixed_density(*p, radius_km, depths) for p in unique}
+            land = [p for p in unique if resolved[p] is None]
+            if land:
+                profiles = fetch_profiles([p[0] for p in land], [p[1] for p in land], depths)
+                for p, profile in zip(land, profiles):
+                    resolved[p] = _land_density(*p, depths, profile[0])
+        return [resolved[p] for p in points]
+
+def _offline_density(lat, lon, radius_km, depths):
+    """get_density from the soil raster alone; SoilGrids masks open water, so a point without data is water"""
+    validate_coordinates(lat, lon)
+    if is_antarctica(lat, lon) or is_greenland(lat, lon): return {depth: 900 for depth in depths}
+    if nearby_cities(lat, lon, radius_km): return {depth: 2650 for depth in depths}
+    raster = soil_raster()
+    if np.isnan(raster.sample(lat, lon, raster.depths)).all(): return {depth: 1 for depth in depths}
+    profile = raster.sample(lat, lon, depths)[0]
+    # fallback default for depths with no valid value above them
+    return {depth: 1300 if value is None else value for depth, value in _fill_depths(depths, profile).items()}
+
+def _fixed_density(lat, lon, radius_km, depths):
+    """Density of water, ice sheets and cities, or None for open land that needs soil data"""
     location_type = get_location_type(lat, lon)
-    if location_type == 'water': return {depth: 1 for depth in DEPTH_RANGES}
-    if location_type in ['antarctica', 'greenland']: return {depth: 900 for depth in DEPTH_RANGES}
-    if nearby_cities(lat, lon, radius_km): return {depth: 2650 for depth in DEPTH_RANGES}
-    densities = soil_bulk_density(lat, lon)
+    if location_type == 'coastal': location_type = 'water' if is_water(lat, lon) else 'land'
+    if location_type == 'water': return {depth: 1 for depth in depths}
+    if location_type in ['antarctica', 'greenland']: return {depth: 900 for depth in depths}
+    if nearby_cities(lat, lon, radius_km): return {depth: 2650 for depth in depths}
+    return None
+
+def _get_density(lat, lon, radius_km, depths):
+    if GROUND_DENSITY_SOURCE == 'raster' and soil_raster() is not None:
+        return _offline_density(lat, lon, radius_km, depths)
+    densities = _fixed_density(lat, lon, radius_km, depths)
+    return densities if densities is not None else _land_density(lat, lon, depths)
+
+def _land_density(lat, lon, depths, profile=None):
+    densities = soil_bulk_density(lat, lon, depths, profile)
     # fallback default if all values are None
-    for depth in DEPTH_RANGES:
+    for depth in depths:
         if densities[depth] is None:
             densities[depth] = 1300
     return densities
@@ -0,0 +1,126 @@
+import os
+import json
+import hashlib
+import numpy as np
+
+PARENT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DATASET_DIR = os.getenv('DATASET_DIR', os.path.join(PARENT_DIR, "datasets"))
+META_FILE = "meta.json"
+
+# Compiled datasets are plain .npy files opened with mmap_mode='r': every
+# gunicorn worker maps the same page-cache pages instead of parsing its own copy.
+
+def _stamp(sources):
+    stamp = []
+    for path in sources:
+        stat = os.stat(path)
+        stamp.append([os.path.abspath(path), stat.st_mtime_ns, stat.st_size])
+    return stamp
+
+def _directory(name, sources):
+    digest = hashlib.sha1("\n".join(os.path.abspath(p) for p in sources).encode()).hexdigest()[:10]
+    return os.path.join(DATASET_DIR, f"{name}-{digest}")
+
+def _read_meta(directory):
+    try:
+        with open(os.path.join(directory, META_FILE), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _write(directory, arrays, meta):
+    os.makedirs(directory, exist_ok=True)
+    suffix = f".{os.getpid()}.tmp"
+    for key, array in arrays.items():
+        path = os.path.join(directory, key + ".npy")
+        with open(path + suffix, 'wb') as f:
+            np.save(f, np.ascontiguousarray(array))
+        os.replace(path + suffix, path)
+    # meta.json goes last: readers only trust arrays it lists
+    path = os.path.join(directory, META_FILE)
+    with open(path + suffix, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    os.replace(path + suffix, path)
+
+def compiled(name, sources, build, version=1):
+    """
+    Read-only memory-mapped arrays derived from source files.
+
+    Args:
+        name: dataset name, used for its directory under DATASET_DIR
+        sources: paths the dataset is derived from; a change in any of them triggers a rebuild
+        build: callable() -> {array name: ndarray}
+        version: bump when build() changes its output format
+
+    Returns:
+        dict: array name -> read-only np.memmap
+    """
+    directory = _directory(name, sources)
+    stamp = _stamp(sources)
+    meta = _read_meta(directory)
+    if meta is None or meta.get('sources') != stamp or meta.get('version') != version:
+        arrays = build()
+        meta = {'version': version, 'sources': stamp, 'arrays': sorted(arrays)}
+        _write(directory, arrays, meta)
+    return {key: np.load(os.path.join(directory, key + ".npy"), mmap_mode='r') for key in meta['arrays']}
+
+def compile_datasets():
+    """
+    Build every compiled dataset whose sources changed, then close them again.
+    Run before workers start (gunicorn.conf.py) so they never race to build.
+    """
+    from calculations.City_Index import CITIES_POPULATION_FILE, city_index
+    from calculations.Coords_Info import large_cities
+    from calculations.Zone_Model import coastline_index
+
+    datasets = [large_cities, coastline_index]
+    if os.path.exists(CITIES_POPULATION_FILE):
+        datasets.append(city_index)
+    for dataset in datasets:
+        dataset()
+        dataset.cache_clear()
+
+def pack_strings(values):
+    """UTF-8 blob and offsets for a list of strings, see StringTable"""
+    encoded = [v.encode('utf-8') for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+def pack_records(records):
+    """JSON-encoded records packed like pack_strings, see RecordTable"""
+    return pack_strings([json.dumps(r, separators=(',', ':')) for r in records])
+
+class StringTable:
+    """Read-only sequence of strings decoded on access from a (possibly memory-mapped) blob"""
+
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def _decode(self, raw):
+        return raw.decode('utf-8')
+
+    def __getitem__(self, i):
+        i = int(i)
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self._decode(self.blob[self.offsets[i]:self.offsets[i + 1]].tobytes())
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+class RecordTable(StringTable):
+    """StringTable of JSON records, returning a fresh dict per access"""
+
+    def _decode(self, raw):
+        return json.loads(raw)
+
+if __name__ == '__main__':
+    compile_datasets()
+    print(f"Datasets compiled in {DATASET_DIR}")
@@ -0,0 +1,172 @@
+import os
+import math
+import struct
+import zlib
+import threading
+from collections import OrderedDict
+import numpy as np
+from calculations.Geometry import KM_PER_DEGREE, bounding_box, great_circle_distance
+from calculations.Metrics import cache_lookup
+from calculations.Zone_Model import zone_radius
+
+# Constants
+MT_TO_J = 4.184e15            # J per megaton of TNT
+LUMINOUS_EFFICIENCY = 3e-3    # fraction of impact energy radiated as heat
+BLAST_PX = 75000              # Pa, reference overpressure (Collins et al. 2005)
+BLAST_RX = 290                # m, reference distance for a 1 kt surface burst
+
+MIN_RESOLUTION = 16
+MAX_RESOLUTION = 1024
+# Total size of cached grids per process; one 1024² grid alone is ~12.6 MB
+GRID_CACHE_BYTES = int(os.getenv('GRID_CACHE_MB', 64)) * 2**20
+
+# Fields are stored as log10(J/m²), log10(Pa) and effective Richter magnitude so
+# they fit in float16 and map linearly onto 8-bit PNG channels.
+FIELDS = ('thermal', 'overpressure', 'seismic')
+FIELD_RANGES = {
+    'thermal': (3.0, 10.0),
+    'overpressure': (2.0, 7.0),
+    'seismic': (0.0, 10.0),
+}
+
+def thermal_exposure(energy_j, distance_m):
+    """Thermal exposure as log10(J/m²) at the given distances (m)"""
+    distance_m = np.maximum(distance_m, 1.0)
+    return np.log10(LUMINOUS_EFFICIENCY * energy_j / (2 * np.pi * distance_m**2))
+
+def overpressure(energy_j, distance_m):
+    """Peak airblast overpressure of a surface burst as log10(Pa) at the given distances (m)"""
+    scaled = np.maximum(distance_m, 1.0) / np.cbrt(energy_j / MT_TO_J * 1000)
+    pressure = (BLAST_PX * BLAST_RX / (4 * scaled)) * (1 + 3 * (BLAST_RX / scaled)**1.3)
+    return np.log10(pressure)
+
+def seismic_intensity(energy_j, distance_km):
+    """Effective Richter magnitude felt at the given distances (km)"""
+    magnitude = 0.67 * np.log10(energy_j) - 5.87
+    distance_km = np.asarray(distance_km, dtype=float)
+    distance_deg = np.maximum(distance_km / KM_PER_DEGREE, 1e-6)
+    return np.select(
+        [distance_km < 60, distance_km < 700],
+        [magnitude - 0.0238 * distance_km, magnitude - 0.0048 * distance_km - 1.1644],
+        magnitude - 1.66 * np.log10(distance_deg) - 6.399,
+    )
+
+class GridCache:
+    """LRU cache of read-only grids bounded by their total size in bytes"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key, value):
+        size = value[1].nbytes
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                return
+            self.entries[key] = value
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.bytes -= evicted.nbytes
+
+_grid_cache = GridCache(GRID_CACHE_BYTES)
+
+def _effects_grid(energy_mt, lat, lon, resolution, radius_km):
+    # Longitudes stay continuous across the antimeridian (east may exceed 180)
+    south, north, west, east = bounding_box(lat, lon, radius_km, wrap=False)
+    # Cell centres, north row first so rows map directly to image rows
+    step_lat = (north - south) / resolution
+    step_lon = (east - west) / resolution
+    lats = north - step_lat * (np.arange(resolution) + 0.5)
+    lons = west + step_lon * (np.arange(resolution) + 0.5)
+
+    distance_km = great_circle_distance(lat, lon, lats[:, None], lons[None, :])
+    energy_j = energy_mt * MT_TO_J
+    grid = np.stack([
+        thermal_exposure(energy_j, distance_km * 1000),
+        overpressure(energy_j, distance_km * 1000),
+        seismic_intensity(energy_j, distance_km),
+    ]).astype(np.float32)
+    grid.flags.writeable = False
+    return (south, west, north, east), grid
+
+def effects_grid(energy_mt, lat, lon, resolution=256, radius_km=None):
+    """
+    Thermal, overpressure and seismic intensity fields around an impact point.
+
+    Inputs are quantised (4 significant digits of energy, ~10 m of position) so
+    nearby requests share the cached grid; the cache holds at most
+    GRID_CACHE_BYTES of grids.
+
+    Args:
+        energy_mt: impact energy in megatons of TNT
+        lat, lon: impact point in degrees
+        resolution: cells per side of the square grid
+        radius_km: half-width of the grid, defaults to the seismic zone radius
+
+    Returns:
+        tuple: ((south, west, north, east) with longitudes continuous across ±180,
+               read-only float32 array shaped (3, resolution, resolution))
+    """
+    if not math.isfinite(energy_mt) or energy_mt <= 0:
+        raise ValueError("Energy must be a positive number")
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError("Latitude or longitude out of range")
+    if not (MIN_RESOLUTION <= resolution <= MAX_RESOLUTION):
+        raise ValueError(f"Resolution must be between {MIN_RESOLUTION} and {MAX_RESOLUTION}")
+    if radius_km is None:
+        radius_km = zone_radius('land', 'seismic', energy_mt)
+    if not math.isfinite(radius_km) or radius_km <= 0:
+        raise ValueError("Radius must be a positive number")
+    key = (float(f"{energy_mt:.4g}"), round(lat, 4), round(lon, 4), int(resolution), float(f"{radius_km:.4g}"))
+    result = _grid_cache.get(key)
+    cache_lookup('effects_grid', result is not None)
+    if result is None:
+        result = _effects_grid(*key)
+        _grid_cache.put(key, result)
+    return result
+
+def normalize(grid, fields):
+    """Scale the selected fields to 0-255 using FIELD_RANGES"""
+    channels = []
+    for field in fields:
+        low, high = FIELD_RANGES[field]
+        scaled = (grid[FIELDS.index(field)] - low) / (high - low)
+        channels.append(np.clip(np.nan_to_num(scaled) * 255, 0, 255).astype(np.uint8))
+    return np.stack(channels, axis=-1)
+
+def encode_png(grid, fields=FIELDS):
+    """
+    Encode one field as grayscale or three fields as RGB PNG bytes.
+    """
+    if len(fields) not in (1, 3):
+        raise ValueError("PNG output needs one or three fields")
+    pixels = normalize(grid, fields)
+    height, width, channels = pixels.shape
+    color_type = 0 if channels == 1 else 2
+    # Filter byte 0 (None) in front of every scanline
+    raw = np.concatenate([np.zeros((height, 1), np.uint8), pixels.reshape(height, -1)], axis=1)
+
+    def chunk(tag, data):
+        return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data))
+
+    return (b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, color_type, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(raw.tobytes(), 6))
+            + chunk(b'IEND', b''))
+
+def encode_float16(grid, fields=FIELDS):
+    """Little-endian float16 bytes of the selected fields, shaped (fields, rows, cols)"""
+    selected = grid[[FIELDS.index(field) for field in fields]]
+    return selected.astype('<f2').tobytes()
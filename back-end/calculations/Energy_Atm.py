@@ -1,5 +1,6 @@
 import numpy as np
 from calculations.Air_Calculations import air_density
+from calculations.Metrics import inc, stage
 
 g = 9.81
 rho_rock = 3000  # kg/m³
@@ -35,13 +36,17 @@ def simulate_meteor_atmospheric_entry(diameter_m, velocity_m_s, entry_angle_deg,
 
     v = velocity_m_s
     h = initial_altitude_m
+    steps = 0
 
-    while h > 0:
-        rho_air = air_density(h)
-        Fd = 0.5 * rho_air * Cd * A * v**2
-        delta_s = step_m / np.sin(theta)
-        v = np.sqrt(max(v**2 - 2 * Fd * delta_s / mass, 0))
-        h -= step_m
+    with stage('atmospheric_entry'):
+        while h > 0:
+            rho_air = air_density(h)
+            Fd = 0.5 * rho_air * Cd * A * v**2
+            delta_s = step_m / np.sin(theta)
+            v = np.sqrt(max(v**2 - 2 * Fd * delta_s / mass, 0))
+            h -= step_m
+            steps += 1
+    inc('entry_simulation_steps_total', steps)
 
     Ek_initial = 0.5 * mass * velocity_m_s**2
     Ek_final = 0.5 * mass * v**2
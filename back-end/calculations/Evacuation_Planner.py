@@ -0,0 +1,187 @@
+import heapq
+import numpy as np
+from calculations.Geometry import EARTH_RADIUS_KM, initial_bearing, unit_vector_distance
+
+HOST_CAPACITY_RATIO = 0.25    # share of a safe city's population it can shelter
+CANDIDATES_PER_CITY = 16      # nearest safe cities considered per affected city
+REFILL_CANDIDATES = 64        # open hosts looked up once a city's candidates are full
+REFILL_BLOCK = 16             # waiting cities of the same sector refilled alongside it
+SAFE_MARGIN_KM = 10           # buffer kept between the outermost zone and destinations
+MAX_BAND_DOUBLINGS = 4
+CHUNK_SIZE = 1024             # affected cities per candidate matrix block
+SECTOR_DEG = 10               # bearing sector width used to narrow candidate search
+SECTORS = int(360 // SECTOR_DEG)
+
+def safe_destinations(index, lat, lon, safe_radius_km, demand):
+    """
+    Safe cities in a band just outside the outermost zone.
+
+    The band starts as wide as the zone itself and doubles until it holds
+    enough cities and shelter capacity for the demand (or stops growing).
+
+    Returns:
+        ndarray: indices into index of candidate destination cities
+    """
+    band = max(safe_radius_km, 200.0)
+    for _ in range(MAX_BAND_DOUBLINGS + 1):
+        safe, _ = index.query_ring(lat, lon, safe_radius_km, safe_radius_km + band)
+        capacity = HOST_CAPACITY_RATIO * index.population[safe].sum()
+        if len(safe) >= CANDIDATES_PER_CITY and capacity >= demand:
+            break
+        if safe_radius_km + band >= np.pi * EARTH_RADIUS_KM:
+            break
+        band *= 2
+    return safe
+
+def bearing_sectors(index, cities, lat, lon):
+    """Bearing sector from the impact point of each city"""
+    return (initial_bearing(lat, lon, index.lat[cities], index.lon[cities]) // SECTOR_DEG).astype(int) % SECTORS
+
+def nearest_candidates(index, affected, safe, lat, lon, k=CANDIDATES_PER_CITY):
+    """
+    k nearest safe cities for every affected city.
+
+    Nearest by great-circle distance is largest dot product of unit vectors,
+    so candidates come from matrix products. The nearest way out of the zone
+    lies roughly along a city's bearing from the impact, so each bearing
+    sector is only matched against safe cities in the same and adjacent
+    sectors (or all of them when those hold fewer than k).
+
+    Returns:
+        tuple: (candidate positions in safe, travel distances in km), both (len(affected), k), nearest first
+    """
+    k = min(k, len(safe))
+    candidates = np.empty((len(affected), k), dtype=np.intp)
+    travel_km = np.empty((len(affected), k))
+    affected_sector = bearing_sectors(index, affected, lat, lon)
+    safe_sector = bearing_sectors(index, safe, lat, lon)
+
+    for sector in np.unique(affected_sector):
+        rows = np.nonzero(affected_sector == sector)[0]
+        offset = (safe_sector - sector) % SECTORS
+        window = np.nonzero((offset <= 1) | (offset == SECTORS - 1))[0]
+        if len(window) < k:
+            window = np.arange(len(safe))
+        for start in range(0, len(rows), CHUNK_SIZE):
+            block = rows[start:start + CHUNK_SIZE]
+            cos = index.xyz[affected[block]] @ index.xyz[safe[window]].T
+            top = np.argpartition(-cos, k - 1, axis=1)[:, :k]
+            top_cos = np.take_along_axis(cos, top, axis=1)
+            order = np.argsort(-top_cos, axis=1)
+            candidates[block] = window[np.take_along_axis(top, order, axis=1)]
+            travel_km[block] = unit_vector_distance(np.take_along_axis(top_cos, order, axis=1))
+    return candidates, travel_km
+
+class OpenHosts:
+    """
+    Safe cities that still have shelter capacity, bucketed by bearing sector
+    from the impact. Lookups only scan the open hosts of a sector and its
+    neighbours (all sectors once those run low), and full hosts are dropped
+    from a sector as it is scanned, so lookups shrink as the plan fills up
+    instead of rescanning every safe city.
+    """
+
+    def __init__(self, safe_xyz, safe_sector, remaining):
+        self.xyz = safe_xyz
+        self.remaining = remaining
+        self.sectors = [np.flatnonzero(safe_sector == sector) for sector in range(SECTORS)]
+
+    def _pool(self, sectors):
+        for sector in sectors:
+            hosts = self.sectors[sector]
+            self.sectors[sector] = hosts[self.remaining[hosts] > 0]
+        return np.concatenate([self.sectors[sector] for sector in sectors])
+
+    def nearest(self, origins_xyz, sector, k=REFILL_CANDIDATES):
+        """
+        k nearest open hosts to each of a block of cities in one bearing sector.
+
+        Returns:
+            tuple: (positions in safe, travel distances in km), both (len(origins_xyz), <= k), nearest first
+        """
+        pool = self._pool(sorted({(sector + offset) % SECTORS for offset in (-1, 0, 1)}))
+        if len(pool) < k:
+            pool = self._pool(range(SECTORS))
+        k = min(k, len(pool))
+        if k == 0:
+            return np.empty((len(origins_xyz), 0), dtype=np.intp), np.empty((len(origins_xyz), 0))
+        cos = origins_xyz @ self.xyz[pool].T
+        top = np.argpartition(-cos, k - 1, axis=1)[:, :k]
+        top_cos = np.take_along_axis(cos, top, axis=1)
+        order = np.argsort(-top_cos, axis=1)
+        return pool[np.take_along_axis(top, order, axis=1)], unit_vector_distance(np.take_along_axis(top_cos, order, axis=1))
+
+def plan_evacuation(index, affected, distances, lat, lon, safe_radius_km):
+    """
+    Assign affected cities to safe destinations under shelter capacity limits.
+
+    Cities leave in priority order (closest to the impact first, then largest
+    population) from a heap, and each fills the nearest destinations that
+    still have capacity. When a city's precomputed candidates are full, the
+    nearest hosts with capacity left are looked up again (OpenHosts), so
+    people are only left unassigned once every safe destination is full.
+
+    Args:
+        index: CityIndex
+        affected: indices into index of affected cities
+        distances: distance of each affected city from the impact (km)
+        lat, lon: impact point
+        safe_radius_km: radius of the outermost zone
+
+    Returns:
+        list: one dict per affected city in evacuation order with keys 'position'
+              (into affected), 'destinations' [(city index, evacuees, travel_km)], 'unassigned'
+    """
+    if len(affected) == 0:
+        return []
+    population = index.population[affected].astype(np.int64)
+    safe = safe_destinations(index, lat, lon, safe_radius_km + SAFE_MARGIN_KM, population.sum())
+    if len(safe):
+        candidates, travel_km = nearest_candidates(index, affected, safe, lat, lon)
+        remaining = np.floor(HOST_CAPACITY_RATIO * index.population[safe]).astype(np.int64)
+        open_hosts = OpenHosts(index.xyz[safe], bearing_sectors(index, safe, lat, lon), remaining)
+        # Cities of a sector leave in heap order, so the ones still waiting are a suffix
+        affected_sector = bearing_sectors(index, affected, lat, lon)
+        queue_order = np.lexsort((-population, distances))
+        sector_queue = [queue_order[affected_sector[queue_order] == sector] for sector in range(SECTORS)]
+        sector_done = np.zeros(SECTORS, dtype=int)
+        refilled = {}
+
+    heap = [(float(d), -int(p), i) for i, (d, p) in enumerate(zip(distances, population))]
+    heapq.heapify(heap)
+
+    plan = []
+    while heap:
+        _, neg_population, i = heapq.heappop(heap)
+        need = -neg_population
+        destinations = []
+        if len(safe):
+            sector = affected_sector[i]
+            sector_done[sector] += 1
+            hosts, host_km = refilled.pop(i) if i in refilled else (candidates[i], travel_km[i])
+        else:
+            hosts, host_km = (), ()
+        while need > 0:
+            if len(hosts):
+                still_open = remaining[hosts] > 0
+                hosts, host_km = hosts[still_open], host_km[still_open]
+            for j, km in zip(hosts, host_km):
+                take = min(need, int(remaining[j]))
+                if take > 0:
+                    remaining[j] -= take
+                    need -= take
+                    destinations.append((int(safe[j]), take, float(km)))
+                    if need <= 0:
+                        break
+            if need <= 0 or not len(safe):
+                break
+            # Refill this city and the next ones waiting in its sector in one lookup:
+            # they compete for the same hosts and would otherwise run out one by one
+            block = np.concatenate([[i], sector_queue[sector][sector_done[sector]:][:REFILL_BLOCK]])
+            block_hosts, block_km = open_hosts.nearest(index.xyz[affected[block]], sector)
+            if not block_hosts.shape[1]:
+                break
+            refilled.update((int(b), (h, km)) for b, h, km in zip(block[1:], block_hosts[1:], block_km[1:]))
+            hosts, host_km = block_hosts[0], block_km[0]
+        plan.append({'position': i, 'destinations': destinations, 'unassigned': int(need)})
+    return plan
@@ -0,0 +1,142 @@
+import numpy as np
+
+EARTH_RADIUS_KM = 6371
+KM_PER_DEGREE = np.pi * EARTH_RADIUS_KM / 180   # great-circle km per degree of arc
+
+def great_circle_distance(lat1, lon1, lat2, lon2):
+    """
+    Great-circle (haversine) distance between points.
+
+    Args:
+        lat1, lon1: origin in degrees (scalars or arrays)
+        lat2, lon2: destination in degrees (scalars or arrays, broadcastable)
+
+    Returns:
+        Distance in km, as a float for scalar input or an ndarray otherwise
+    """
+    lat1, lon1, lat2, lon2 = (np.radians(x) for x in (lat1, lon1, lat2, lon2))
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = np.sin(dlat / 2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2)**2
+    return EARTH_RADIUS_KM * 2 * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+def lat_band_area(lat_south, lat_north, dlon_deg):
+    """
+    Area of a lat/lon cell (or band) on the sphere.
+
+    Args:
+        lat_south, lat_north: cell edges in degrees (scalars or arrays)
+        dlon_deg: cell width in degrees
+
+    Returns:
+        Area in km²
+    """
+    return (EARTH_RADIUS_KM**2 * np.radians(dlon_deg)
+            * np.abs(np.sin(np.radians(lat_north)) - np.sin(np.radians(lat_south))))
+
+def initial_bearing(lat1, lon1, lat2, lon2):
+    """
+    Initial bearing of the great circle from origin to destination.
+
+    Returns:
+        Bearing in degrees clockwise from north, in [0, 360)
+    """
+    lat1, lon1, lat2, lon2 = (np.radians(x) for x in (lat1, lon1, lat2, lon2))
+    dlon = lon2 - lon1
+    y = np.sin(dlon) * np.cos(lat2)
+    x = np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * np.cos(lat2) * np.cos(dlon)
+    return np.degrees(np.arctan2(y, x)) % 360
+
+def wrap_longitude(lon):
+    """Longitudes in degrees mapped to [-180, 180)"""
+    return (np.asarray(lon) + 180) % 360 - 180
+
+def destination_point(lat, lon, bearing_deg, distance_km):
+    """
+    Point reached by travelling distance_km along the great circle leaving
+    (lat, lon) at bearing_deg. All arguments broadcast.
+
+    Returns:
+        tuple: (lat, lon) in degrees, lon in [-180, 180)
+    """
+    lat, lon, bearing = (np.radians(x) for x in (lat, lon, bearing_deg))
+    angular = np.asarray(distance_km) / EARTH_RADIUS_KM
+    lat2 = np.arcsin(np.clip(np.sin(lat) * np.cos(angular)
+                             + np.cos(lat) * np.sin(angular) * np.cos(bearing), -1, 1))
+    lon2 = lon + np.arctan2(np.sin(bearing) * np.sin(angular) * np.cos(lat),
+                            np.cos(angular) - np.sin(lat) * np.sin(lat2))
+    return np.degrees(lat2), wrap_longitude(np.degrees(lon2))
+
+def bounding_box(lat, lon, radius_km, wrap=True):
+    """
+    Smallest lat/lon box holding every point within radius_km of (lat, lon).
+
+    The longitude half-width is taken at the latitude where the circle is
+    widest, asin(sin(r) / cos(lat)), rather than at the box edge.
+
+    Args:
+        wrap: map west/east into [-180, 180); otherwise they stay continuous
+              around lon (west < east, either may pass ±180), as rasters need
+
+    Returns:
+        tuple: (south, north, west, east) in degrees. With wrap, west > east when
+               the box crosses the antimeridian. A box spanning every longitude
+               (the circle covers a pole) is (-180, 180) with wrap, else lon ± 180
+    """
+    angular = radius_km / EARTH_RADIUS_KM
+    dlat = float(np.degrees(angular))
+    south, north = lat - dlat, lat + dlat
+    if south <= -90 or north >= 90 or np.sin(angular) >= np.cos(np.radians(lat)):
+        west, east = (-180.0, 180.0) if wrap else (lon - 180.0, lon + 180.0)
+        return max(south, -90.0), min(north, 90.0), west, east
+    dlon = float(np.degrees(np.arcsin(np.sin(angular) / np.cos(np.radians(lat)))))
+    if not wrap:
+        return south, north, lon - dlon, lon + dlon
+    return south, north, float(wrap_longitude(lon - dlon)), float(wrap_longitude(lon + dlon))
+
+def in_bounding_box(lat, lon, box):
+    """Boolean mask of points (arrays in degrees) inside a bounding_box() result"""
+    south, north, west, east = box
+    lat, lon = np.asarray(lat), np.asarray(lon)
+    inside = (lat >= south) & (lat <= north)
+    if east - west >= 360:
+        return inside
+    if west <= east:
+        return inside & (lon >= west) & (lon <= east)
+    return inside & ((lon >= west) | (lon <= east))
+
+def within_radius(lat, lon, radius_km, lats, lons):
+    """
+    Points within radius_km of (lat, lon). A bounding-box prefilter keeps the
+    exact distance to the few candidates near the query.
+
+    Returns:
+        tuple: (indices into lats/lons ascending, distances in km)
+    """
+    idx = np.flatnonzero(in_bounding_box(lats, lons, bounding_box(lat, lon, radius_km)))
+    dist = great_circle_distance(lat, lon, np.asarray(lats)[idx], np.asarray(lons)[idx])
+    keep = dist <= radius_km
+    return idx[keep], dist[keep]
+
+def cap_area(radius_km):
+    """
+    Area of the spherical cap within radius_km (scalar or array) of a point.
+
+    Returns:
+        Area in km²
+    """
+    angular = np.minimum(np.asarray(radius_km, dtype=float), np.pi * EARTH_RADIUS_KM) / EARTH_RADIUS_KM
+    return 2 * np.pi * EARTH_RADIUS_KM**2 * (1 - np.cos(angular))
+
+def ring_area(inner_km, outer_km):
+    """Area in km² between two radii around a point (scalars or arrays)"""
+    return cap_area(outer_km) - cap_area(inner_km)
+
+def unit_vectors(lat, lon):
+    """Cartesian unit vectors (n, 3) for points in degrees"""
+    lat, lon = np.radians(lat), np.radians(lon)
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+def unit_vector_distance(dot):
+    """Great-circle distance in km from dot products of unit vectors"""
+    return EARTH_RADIUS_KM * np.arccos(np.clip(dot, -1, 1))
@@ -0,0 +1,106 @@
+import os
+import gzip
+from flask.json.provider import DefaultJSONProvider
+from calculations.Metrics import stage
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# RESPONSE_COMPRESSION=0 disables compression, e.g. behind a proxy that already compresses
+COMPRESSION_ENABLED = os.getenv('RESPONSE_COMPRESSION', '1') != '0'
+COMPRESS_MIN_BYTES = int(os.getenv('COMPRESS_MIN_BYTES', 4096))
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4            # low qualities are far cheaper and still beat gzip on JSON
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'text/plain')
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider serializing with orjson when it is installed, falling
+    back to the standard library. Both paths accept NumPy arrays and scalars.
+    """
+
+    @staticmethod
+    def default(o):
+        # Arrays and NumPy scalars, checked by module so numpy is not imported here
+        if type(o).__module__ == 'numpy' and hasattr(o, 'tolist'):
+            return o.tolist()
+        return DefaultJSONProvider.default(o)
+
+    def _orjson_options(self):
+        options = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        return options | orjson.OPT_SORT_KEYS if self.sort_keys else options
+
+    def _pretty(self):
+        return (self.compact is None and self._app.debug) or self.compact is False
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and not kwargs:
+            try:
+                return orjson.dumps(obj, default=self.default, option=self._orjson_options()).decode()
+            except TypeError:
+                pass  # e.g. integers beyond 64 bits; the standard encoder copes
+        return super().dumps(obj, **kwargs)
+
+    def response(self, *args, **kwargs):
+        if orjson is None or self._pretty():
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        try:
+            body = orjson.dumps(obj, default=self.default, option=self._orjson_options() | orjson.OPT_APPEND_NEWLINE)
+        except TypeError:
+            return super().response(*args, **kwargs)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+def choose_encoding(accept_encoding):
+    """Best supported content coding the client accepts: 'br', 'gzip' or None"""
+    accepted = {}
+    for part in accept_encoding.split(','):
+        coding, _, params = part.strip().partition(';')
+        q = 1.0
+        if params.strip().startswith('q='):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip().lower()] = q
+    for coding in ('br', 'gzip'):
+        if coding == 'br' and brotli is None:
+            continue
+        if accepted.get(coding, accepted.get('*', 0)) > 0:
+            return coding
+    return None
+
+def compress_response(response, accept_encoding):
+    """
+    Compress a buffered JSON or text response in place when it is large enough
+    and the client accepts br or gzip. Streamed responses are left alone.
+    """
+    if (not COMPRESSION_ENABLED or response.direct_passthrough or response.is_streamed
+            or response.status_code < 200 or response.status_code in (204, 304)
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+    response.vary.add('Accept-Encoding')
+    if response.content_length is not None and response.content_length < COMPRESS_MIN_BYTES:
+        return response
+    coding = choose_encoding(accept_encoding or '')
+    if coding is None:
+        return response
+
+    with stage(f'compress_{coding}'):
+        body = response.get_data()
+        if len(body) < COMPRESS_MIN_BYTES:
+            return response
+        if coding == 'br':
+            compressed = brotli.compress(body, quality=BROTLI_QUALITY)
+        else:
+            compressed = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = coding
+    return response
@@ -0,0 +1,42 @@
+import math
+from calculations.Coords_Info import get_density
+from calculations.Energy_Atm import simulate_meteor_atmospheric_entry
+from calculations.Impact_Calculations import ImpactCalculations
+from calculations.Properties_Calculations import PropertiesCalculations
+
+def run_impact(velocity, mass, diameter, angle, latitude, longitude, ground_density=None):
+    """
+    Full ground-impact pipeline: atmospheric entry, ground density lookup and
+    crater/ejecta scaling. Shared by the /impact route and batch jobs.
+
+    Args:
+        velocity: entry velocity (m/s)
+        mass: asteroid mass (kg)
+        diameter: asteroid diameter (m)
+        angle: entry angle from horizontal (degrees)
+        latitude, longitude: impact point (degrees)
+        ground_density: get_density() result for the impact point, looked up when None
+
+    Returns:
+        dict: the /impact response fields
+    """
+    (final_energy, final_velocity, final_mass, lost_energy, percent_lost) = simulate_meteor_atmospheric_entry(diameter, velocity, angle)
+
+    asteroid_density = (mass / ((4/3) * math.pi * (diameter/2)**3)) / 1000  # Convert to g/cm³
+    # Every depth comes back in one SoilGrids query; the shallower ones are what a
+    # missing 100-200cm value falls back to
+    if ground_density is None:
+        ground_density = get_density(latitude, longitude)  # g/cm³
+
+    init_crater_diameter = ImpactCalculations.calculateInitialCraterDiameter(diameter, asteroid_density, velocity, ground_density['100-200cm'])
+    excavated_mass = ImpactCalculations.calculateExcavatedMass(init_crater_diameter, ground_density['100-200cm'])
+    minimal_ejection_velocity = ImpactCalculations.calculateMinimalEjectionVelocity(init_crater_diameter)
+    percent_to_space = ImpactCalculations.calculateMassToEscapeGravity(minimal_ejection_velocity, excavated_mass)
+
+    return {
+        'percent_to_space': percent_to_space,
+        'impact_energy': final_energy,
+        'lost_energy': lost_energy,
+        'impact_energy_tnt': PropertiesCalculations.convertJoulesTNTTons(final_energy),
+        'impact_energy_hiroshima': PropertiesCalculations.convertJoulesHiroshima(final_energy),
+    }
@@ -0,0 +1,183 @@
+import os
+import json
+import time
+import logging
+import threading
+
+# METRICS_ENABLED=0 turns every hook below into a no-op
+ENABLED = os.getenv('METRICS_ENABLED', '1') != '0'
+# REQUEST_TIMING_LOG=1 logs one JSON line per request with its stage timings
+TIMING_LOG = os.getenv('REQUEST_TIMING_LOG', '0') == '1'
+
+PREFIX = 'meteor_'
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+HELP = {
+    'http_request_seconds': ('histogram', "Request latency by route"),
+    'stage_seconds': ('histogram', "Latency of instrumented pipeline stages"),
+    'upstream_request_seconds': ('histogram', "Latency of calls to external services"),
+    'upstream_requests_total': ('counter', "Calls to external services by outcome"),
+    'upstream_throttled_total': ('counter', "Upstream calls answered with HTTP 429"),
+    'upstream_fallbacks_total': ('counter', "Upstream calls answered from stale cache or an offline fallback"),
+    'circuit_open': ('gauge', "1 while an upstream's circuit breaker is open"),
+    'cache_requests_total': ('counter', "Cache lookups by result"),
+    'entry_simulation_steps_total': ('counter', "Atmospheric entry integration steps"),
+}
+
+timing_logger = logging.getLogger('meteor.timing')
+if TIMING_LOG and not timing_logger.handlers:
+    timing_logger.addHandler(logging.StreamHandler())
+    timing_logger.setLevel(logging.INFO)
+    timing_logger.propagate = False
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_gauges = {}
+_local = threading.local()
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+def inc(name, value=1, **labels):
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def set_gauge(name, value, **labels):
+    if not ENABLED:
+        return
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+def observe(name, seconds, **labels):
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [0] * len(BUCKETS) + [0.0, 0]
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                histogram[i] += 1
+        histogram[-2] += seconds
+        histogram[-1] += 1
+
+def cache_lookup(cache, hit):
+    inc('cache_requests_total', cache=cache, result='hit' if hit else 'miss')
+
+class _Null:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL = _Null()
+
+class _Stage:
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        self.record(elapsed, exc_type)
+        stages = getattr(_local, 'stages', None)
+        if stages is not None:
+            stages[self.name] = stages.get(self.name, 0.0) + elapsed
+        return False
+
+    def record(self, elapsed, exc_type):
+        observe('stage_seconds', elapsed, stage=self.name)
+
+class _Upstream(_Stage):
+    """Times one external call; set .status to the HTTP status code inside the block"""
+
+    def __init__(self, upstream):
+        super().__init__(f"upstream:{upstream}")
+        self.upstream = upstream
+        self.status = None
+
+    def record(self, elapsed, exc_type):
+        if exc_type is not None:
+            outcome = 'error'
+        elif self.status is None:
+            outcome = 'ok'
+        else:
+            outcome = str(self.status)
+            if self.status == 429:
+                inc('upstream_throttled_total', upstream=self.upstream)
+        observe('upstream_request_seconds', elapsed, upstream=self.upstream)
+        inc('upstream_requests_total', upstream=self.upstream, outcome=outcome)
+
+def stage(name):
+    """Context manager timing a pipeline stage"""
+    return _Stage(name) if ENABLED else _NULL
+
+def upstream(name):
+    """Context manager timing a call to an external service"""
+    return _Upstream(name) if ENABLED else _NULL
+
+def start_request():
+    if ENABLED:
+        _local.stages = {}
+        _local.start = time.perf_counter()
+
+def finish_request(method, route, status):
+    """Record the request latency and emit the timing log line when enabled"""
+    if not ENABLED or getattr(_local, 'stages', None) is None:
+        return
+    elapsed = time.perf_counter() - _local.start
+    observe('http_request_seconds', elapsed, method=method, route=route, status=str(status))
+    if TIMING_LOG:
+        timing_logger.info(json.dumps({
+            'method': method,
+            'route': route,
+            'status': status,
+            'duration_ms': round(1000 * elapsed, 3),
+            'stages_ms': {name: round(1000 * s, 3) for name, s in _local.stages.items()},
+        }))
+    _local.stages = None
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+def render():
+    """All metrics in the Prometheus text exposition format"""
+    with _lock:
+        counters = dict(_counters)
+        histograms = {k: list(v) for k, v in _histograms.items()}
+        gauges = dict(_gauges)
+
+    lines = []
+    for name, (kind, text) in HELP.items():
+        full = PREFIX + name
+        series = {'counter': counters, 'gauge': gauges}.get(kind, histograms)
+        keys = sorted(k for k in series if k[0] == name)
+        if not keys:
+            continue
+        lines.append(f"# HELP {full} {text}")
+        lines.append(f"# TYPE {full} {kind}")
+        for key in keys:
+            labels = key[1]
+            if kind != 'histogram':
+                lines.append(f"{full}{_labels(labels)} {series[key]}")
+                continue
+            histogram = histograms[key]
+            for bound, count in zip(BUCKETS, histogram):
+                lines.append(f"{full}_bucket{_labels(labels, [('le', bound)])} {count}")
+            lines.append(f"{full}_bucket{_labels(labels, [('le', '+Inf')])} {histogram[-1]}")
+            lines.append(f"{full}_sum{_labels(labels)} {histogram[-2]}")
+            lines.append(f"{full}_count{_labels(labels)} {histogram[-1]}")
+    return "\n".join(lines) + "\n"
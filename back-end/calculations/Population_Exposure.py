@@ -0,0 +1,182 @@
+import os
+import json
+import argparse
+from functools import lru_cache
+import numpy as np
+from calculations.Geometry import EARTH_RADIUS_KM, lat_band_area
+
+PARENT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+POPULATION_GRID_DIR = os.getenv('POPULATION_GRID_DIR', os.path.join(PARENT_DIR, "population_grid"))
+PREFIX_FILE = "row_prefix.npy"
+META_FILE = "meta.json"
+ROW_SUBSAMPLES = 8            # latitudes sampled across the part of a row a cap covers
+
+class PopulationGrid:
+    """
+    Population counts on a regular lat/lon grid, stored as per-row prefix sums.
+
+    row_prefix[r, c] is the population of the first c cells of row r, so the
+    population of any longitude span of a row is two lookups. A spherical cap
+    is integrated row by row: the latitudes a cap covers within each row are
+    split into ROW_SUBSAMPLES bands, each contributing the span under the cap's
+    longitude half-width there, weighted by its share of the row's area. This
+    touches O(rows in cap) entries instead of every cell inside it, and small
+    caps that miss every row centre are still counted. Partial cells at the
+    span edges are weighted by the covered fraction, which is area-proportional
+    because cells in one row share the same area.
+    """
+
+    def __init__(self, row_prefix, north, west, cellsize):
+        self.row_prefix = row_prefix
+        self.rows = row_prefix.shape[0]
+        self.cols = row_prefix.shape[1] - 1
+        self.north = north
+        self.west = west
+        self.cellsize = cellsize
+        self.lats = north - cellsize * (np.arange(self.rows) + 0.5)
+        self.is_global = abs(self.cols * cellsize - 360) < 1e-6
+
+    @classmethod
+    def load(cls, directory=POPULATION_GRID_DIR):
+        """Memory-map a grid written by build_population_grid"""
+        with open(os.path.join(directory, META_FILE), encoding='utf-8') as f:
+            meta = json.load(f)
+        row_prefix = np.load(os.path.join(directory, PREFIX_FILE), mmap_mode='r')
+        return cls(row_prefix, meta['north'], meta['west'], meta['cellsize'])
+
+    def _span_totals(self, rows, col_lo, col_hi):
+        """Population between fractional column positions on each row"""
+        return self._cumulative(rows, col_hi) - self._cumulative(rows, col_lo)
+
+    def _cumulative(self, rows, col):
+        if self.is_global:
+            turns = np.floor(col / self.cols)
+            col = col - turns * self.cols
+        else:
+            turns = 0
+            col = np.clip(col, 0, self.cols)
+        base = np.minimum(np.floor(col).astype(np.intp), self.cols - 1)
+        frac = col - base
+        left = self.row_prefix[rows, base]
+        right = self.row_prefix[rows, base + 1]
+        return turns * self.row_prefix[rows, -1] + left + frac * (right - left)
+
+    def cap_total(self, lat, lon, radius_km):
+        """Population within radius_km of a point"""
+        if radius_km <= 0:
+            return 0.0
+        angular = radius_km / EARTH_RADIUS_KM
+        reach = np.degrees(angular)
+        cap_south, cap_north = max(lat - reach, -90.0), min(lat + reach, 90.0)
+        first = max(int(np.floor((self.north - cap_north) / self.cellsize)), 0)
+        last = min(int(np.ceil((self.north - cap_south) / self.cellsize)), self.rows)
+        if first >= last:
+            return 0.0
+        rows = np.arange(first, last)
+        row_north = self.north - self.cellsize * rows
+        row_south = row_north - self.cellsize
+
+        # The part of each row's latitude range the cap reaches, split into
+        # sub-bands weighted by their share of the row's area
+        south, north = np.maximum(row_south, cap_south), np.minimum(row_north, cap_north)
+        covered = north > south
+        rows, row_south, row_north = rows[covered], row_south[covered], row_north[covered]
+        edges = south[covered, None] + (north - south)[covered, None] * np.linspace(0, 1, ROW_SUBSAMPLES + 1)
+        weight = (lat_band_area(edges[:, :-1], edges[:, 1:], self.cellsize)
+                  / lat_band_area(row_south, row_north, self.cellsize)[:, None])
+        phi0, phi = np.radians(lat), np.radians((edges[:, :-1] + edges[:, 1:]) / 2)
+        rows = np.broadcast_to(rows[:, None], phi.shape)
+
+        # Longitude half-width of the cap along each sub-band's centre latitude
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cos_dlon = (np.cos(angular) - np.sin(phi0) * np.sin(phi)) / (np.cos(phi0) * np.cos(phi))
+        cos_dlon = np.nan_to_num(cos_dlon, nan=-1.0, posinf=1.0, neginf=-1.0)
+        inside = cos_dlon <= 1
+        whole_row = cos_dlon <= -1
+        half_width = np.degrees(np.arccos(np.clip(cos_dlon, -1, 1)))
+
+        total = (weight[whole_row] * self.row_prefix[rows[whole_row], -1]).sum() if self.is_global else 0.0
+        partial = inside & ~whole_row if self.is_global else inside
+        if partial.any():
+            center = (lon - self.west) / self.cellsize
+            width = half_width[partial] / self.cellsize
+            total += (weight[partial] * self._span_totals(rows[partial], center - width, center + width)).sum()
+        return float(total)
+
+    def ring_totals(self, lat, lon, radii_km):
+        """
+        Population in each ring between consecutive radii.
+
+        Args:
+            radii_km: outer radii in any order
+
+        Returns:
+            list: population inside each radius but outside the next smaller one,
+                  in the same order as radii_km
+        """
+        order = np.argsort(radii_km)
+        caps = [self.cap_total(lat, lon, radii_km[i]) for i in order]
+        rings = np.diff([0.0] + caps)
+        result = [0.0] * len(radii_km)
+        for i, ring in zip(order, rings):
+            result[i] = max(float(ring), 0.0)
+        return result
+
+@lru_cache(maxsize=1)
+def population_grid():
+    """Shared grid instance, or None when no grid has been built"""
+    if not os.path.exists(os.path.join(POPULATION_GRID_DIR, PREFIX_FILE)):
+        return None
+    return PopulationGrid.load(POPULATION_GRID_DIR)
+
+def read_ascii_grid(path):
+    """
+    Read an ESRI ASCII grid (the format GPW and similar datasets ship in).
+
+    Returns:
+        tuple: (data, north, west, cellsize, nodata)
+    """
+    header = {}
+    with open(path, encoding='utf-8') as f:
+        for _ in range(6):
+            key, value = f.readline().split()
+            header[key.lower()] = float(value)
+        data = np.loadtxt(f, dtype=np.float32)
+    north = header['yllcorner'] + header['nrows'] * header['cellsize']
+    return data, north, header['xllcorner'], header['cellsize'], header.get('nodata_value')
+
+def build_population_grid(source, directory=POPULATION_GRID_DIR, kind='count'):
+    """
+    Convert a population raster into the memory-mappable prefix-sum layout.
+
+    Args:
+        source: ESRI ASCII grid path
+        directory: output directory
+        kind: 'count' for people per cell, 'density' for people per km²
+              (converted to counts using each row's spherical cell area)
+    """
+    data, north, west, cellsize, nodata = read_ascii_grid(source)
+    if nodata is not None:
+        data[data == nodata] = 0
+    data = np.nan_to_num(np.maximum(data, 0))
+    if kind == 'density':
+        edges = north - cellsize * np.arange(data.shape[0] + 1)
+        data = data * lat_band_area(edges[1:], edges[:-1], cellsize)[:, None]
+
+    os.makedirs(directory, exist_ok=True)
+    row_prefix = np.lib.format.open_memmap(os.path.join(directory, PREFIX_FILE), mode='w+',
+                                           dtype=np.float64, shape=(data.shape[0], data.shape[1] + 1))
+    row_prefix[:, 0] = 0
+    np.cumsum(data, axis=1, dtype=np.float64, out=row_prefix[:, 1:])
+    row_prefix.flush()
+    with open(os.path.join(directory, META_FILE), 'w', encoding='utf-8') as f:
+        json.dump({'north': north, 'west': west, 'cellsize': cellsize}, f)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build the population prefix-sum grid")
+    parser.add_argument('source', help="ESRI ASCII population raster")
+    parser.add_argument('--kind', choices=['count', 'density'], default='count')
+    parser.add_argument('--output', default=POPULATION_GRID_DIR)
+    args = parser.parse_args()
+    build_population_grid(args.source, args.output, args.kind)
+    print(f"Population grid written to {args.output}")
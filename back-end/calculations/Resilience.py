@@ -0,0 +1,223 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from calculations.Metrics import inc, set_gauge, upstream
+
+# Whole-request budget shared by every upstream call made while serving it
+REQUEST_BUDGET_S = float(os.getenv('REQUEST_BUDGET_S', 25))
+MIN_CALL_S = 0.05             # below this much budget an upstream call is not attempted
+
+FAILURE_THRESHOLD = 5         # consecutive failures that open a breaker
+RESET_TIMEOUT_S = 30          # open time before a single trial call is let through
+
+# name: (timeout s, fresh s, stale s, cache entries)
+UPSTREAMS = {
+    'nasa_neows': (10, 3600, 7 * 86400, 2048),
+    # Catalog syncs: uncached, and a breaker of their own so they never trip the interactive one
+    'nasa_neows_sync': (30, 0, 0, 1),
+    'google_elevation': (5, 30 * 86400, 365 * 86400, 8192),
+    'soilgrids': (8, 30 * 86400, 365 * 86400, 8192),
+}
+
+class UpstreamError(Exception):
+    """An upstream answered, but not with something usable"""
+
+class UpstreamUnavailable(Exception):
+    """No fresh or stale answer could be produced for an upstream call"""
+
+    def __init__(self, name, reason, cause=None):
+        super().__init__(f"{name} unavailable ({reason}){': ' + str(cause) if cause else ''}")
+        self.name = name
+        self.reason = reason
+        self.cause = cause
+
+class UpstreamRejected(Exception):
+    """
+    The upstream refused the request itself (a 4xx other than 429), e.g. an
+    unknown id. It is healthy, so this never counts against its breaker.
+    """
+
+    def __init__(self, name, status, cause=None):
+        super().__init__(f"{name} rejected the request ({status})")
+        self.name = name
+        self.status = status
+        self.cause = cause
+
+def is_client_error(status):
+    """4xx answers that are the caller's fault; 429 means the upstream is overloaded"""
+    return 400 <= status < 500 and status != 429
+
+class CircuitBreaker:
+    """
+    Closed until FAILURE_THRESHOLD consecutive failures, then open (calls are
+    refused) for RESET_TIMEOUT_S, then half-open: one trial call decides
+    whether it closes again or re-opens.
+    """
+
+    def __init__(self, name, failure_threshold=FAILURE_THRESHOLD, reset_timeout_s=RESET_TIMEOUT_S):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout_s:
+            return 'half_open'
+        return 'open'
+
+    def allow(self):
+        with self.lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+        set_gauge('circuit_open', 0, upstream=self.name)
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_in_flight = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                opened = True
+            else:
+                opened = False
+        if opened:
+            set_gauge('circuit_open', 1, upstream=self.name)
+
+class StaleCache:
+    """LRU cache whose entries are fresh for fresh_s and still servable as stale for stale_s"""
+
+    def __init__(self, fresh_s, stale_s, maxsize):
+        self.fresh_s = fresh_s
+        self.stale_s = stale_s
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, allow_stale=False):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            age = time.monotonic() - entry[0]
+            if age <= self.fresh_s or (allow_stale and age <= self.stale_s):
+                self.entries.move_to_end(key)
+                return entry
+            return None
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic(), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+_breakers = {name: CircuitBreaker(name) for name in UPSTREAMS}
+_caches = {name: StaleCache(fresh, stale, size) for name, (_, fresh, stale, size) in UPSTREAMS.items()}
+_local = threading.local()
+
+def breaker(name):
+    return _breakers[name]
+
+def forget(name, key):
+    """Drop one cached answer, e.g. after the data behind it changed"""
+    cache = _caches[name]
+    with cache.lock:
+        cache.entries.pop(key, None)
+
+def start_budget(seconds=REQUEST_BUDGET_S):
+    _local.deadline = time.monotonic() + seconds
+
+def clear_budget():
+    _local.deadline = None
+
+def remaining_budget():
+    """Seconds left for the current request, or None outside a budgeted request"""
+    deadline = getattr(_local, 'deadline', None)
+    return None if deadline is None else deadline - time.monotonic()
+
+def call_upstream(name, send, parse=None, key=None, fallback=None):
+    """
+    Make one upstream call through its cache, circuit breaker and the request budget.
+
+    Args:
+        name: key of UPSTREAMS
+        send: callable(timeout) performing the HTTP request and returning the response
+        parse: callable(response) -> value, raising UpstreamError for unusable answers
+               (defaults to response.json())
+        key: cache key; None disables caching
+        fallback: callable() -> value used when no fresh or stale answer exists or
+                  the request was rejected; without it UpstreamUnavailable (or
+                  UpstreamRejected for 4xx answers) is raised
+
+    Returns:
+        The parsed (possibly cached or stale) value, or the fallback's value
+    """
+    cache = _caches[name]
+    if key is not None:
+        entry = cache.get(key)
+        if entry is not None:
+            inc('cache_requests_total', cache=name, result='hit')
+            return entry[1]
+        inc('cache_requests_total', cache=name, result='miss')
+
+    timeout = UPSTREAMS[name][0]
+    remaining = remaining_budget()
+    cause = None
+    if remaining is not None and remaining < MIN_CALL_S:
+        reason = 'budget'
+    elif not _breakers[name].allow():
+        reason = 'circuit_open'
+    else:
+        if remaining is not None:
+            timeout = min(timeout, remaining)
+        try:
+            with upstream(name) as call:
+                response = send(timeout)
+                call.status = response.status_code
+            if is_client_error(response.status_code):
+                raise UpstreamRejected(name, response.status_code)
+            response.raise_for_status()
+            value = parse(response) if parse else response.json()
+        except UpstreamRejected:
+            _breakers[name].record_success()
+            if fallback is not None:
+                inc('upstream_fallbacks_total', upstream=name, reason='rejected', source='fallback')
+                return fallback()
+            raise
+        except Exception as e:
+            _breakers[name].record_failure()
+            reason, cause = 'error', e
+        else:
+            _breakers[name].record_success()
+            if key is not None:
+                cache.put(key, value)
+            return value
+
+    if key is not None:
+        entry = cache.get(key, allow_stale=True)
+        if entry is not None:
+            inc('upstream_fallbacks_total', upstream=name, reason=reason, source='stale_cache')
+            return entry[1]
+    if fallback is not None:
+        inc('upstream_fallbacks_total', upstream=name, reason=reason, source='fallback')
+        return fallback()
+    inc('upstream_fallbacks_total', upstream=name, reason=reason, source='none')
+    raise UpstreamUnavailable(name, reason, cause)
@@ -0,0 +1,56 @@
+import requests
+import numpy as np
+from calculations.Resilience import call_upstream
+
+SOILGRIDS_URL = "https://rest.isric.org/soilgrids/v2.0/properties/query"
+DEPTH_RANGES = ['0-5cm', '5-15cm', '15-30cm', '30-60cm', '60-100cm', '100-200cm']
+PROPERTIES = ('bdod',)
+POINT_DECIMALS = 3            # ~100 m, finer than the 250 m SoilGrids cells
+
+# Mapped SoilGrids units -> units returned here; properties not listed stay in mapped units
+SCALE = {'bdod': 10.0}        # cg/cm³ -> kg/m³
+
+def _parse_profile(properties, depths, response):
+    """(properties, depths) array of mean values from a query response, NaN where missing"""
+    profile = np.full((len(properties), len(depths)), np.nan)
+    for layer in response.json().get('properties', {}).get('layers', []):
+        if layer.get('name') not in properties:
+            continue
+        p = properties.index(layer['name'])
+        for d in layer.get('depths', []):
+            mean = d.get('values', {}).get('mean')
+            if d.get('label') in depths and mean is not None:
+                profile[p, depths.index(d['label'])] = mean * SCALE.get(layer['name'], 1.0)
+    return profile
+
+def fetch_profile(lat, lon, depths=DEPTH_RANGES, properties=PROPERTIES):
+    """
+    Every requested depth and property of one point in a single SoilGrids query.
+
+    Returns:
+        ndarray: (properties, depths), NaN where SoilGrids has no value or could not be reached
+    """
+    depths, properties = list(depths), list(properties)
+    unknown = set(depths) - set(DEPTH_RANGES)
+    if unknown:
+        raise ValueError(f"Unknown SoilGrids depths: {sorted(unknown)}")
+    lat, lon = round(float(lat), POINT_DECIMALS), round(float(lon), POINT_DECIMALS)
+    params = {'lon': lon, 'lat': lat, 'property': properties, 'depth': depths, 'value': 'mean'}
+    return call_upstream('soilgrids', lambda timeout: requests.get(SOILGRIDS_URL, params=params, timeout=timeout),
+                         lambda response: _parse_profile(properties, depths, response),
+                         key=(lat, lon, tuple(properties), tuple(depths)),
+                         fallback=lambda: np.full((len(properties), len(depths)), np.nan))
+
+def fetch_profiles(lat, lon, depths=DEPTH_RANGES, properties=PROPERTIES):
+    """
+    Profiles for many points, one query per distinct SoilGrids cell.
+    Queries run one after another: SoilGrids' fair-use limit is a few calls per
+    minute, so parallel requests would only be throttled.
+
+    Returns:
+        ndarray: (points, properties, depths)
+    """
+    points = np.round(np.column_stack([np.atleast_1d(lat), np.atleast_1d(lon)]).astype(float), POINT_DECIMALS)
+    unique, inverse = np.unique(points, axis=0, return_inverse=True)
+    profiles = np.stack([fetch_profile(p_lat, p_lon, depths, properties) for p_lat, p_lon in unique])
+    return profiles[inverse.ravel()]
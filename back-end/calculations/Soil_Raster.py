@@ -0,0 +1,129 @@
+import os
+import json
+import argparse
+from functools import lru_cache
+import numpy as np
+from calculations.Population_Exposure import read_ascii_grid
+from calculations.Soil_Profile import DEPTH_RANGES, SCALE
+
+PARENT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SOIL_RASTER_DIR = os.getenv('SOIL_RASTER_DIR', os.path.join(PARENT_DIR, "soil_raster"))
+VALUES_FILE = "bdod.npy"
+META_FILE = "meta.json"
+NODATA = 0                    # SoilGrids never reports a bulk density of 0
+
+class SoilRaster:
+    """
+    Coarse global bulk density, one band per SoilGrids depth, stored as uint16
+    SoilGrids units (cg/cm³) in a (depths, rows, cols) memory-mapped array.
+
+    Points are bilinearly interpolated between the four surrounding cell
+    centres; neighbours without data are dropped and the remaining weights
+    renormalised, so coastlines do not bleed towards zero.
+    """
+
+    def __init__(self, values, depths, north, west, cellsize):
+        self.values = values
+        self.depths = list(depths)
+        self.rows, self.cols = values.shape[1:]
+        self.north = north
+        self.west = west
+        self.cellsize = cellsize
+        self.is_global = abs(self.cols * cellsize - 360) < 1e-6
+
+    @classmethod
+    def load(cls, directory=SOIL_RASTER_DIR):
+        """Memory-map a raster written by build_soil_raster"""
+        with open(os.path.join(directory, META_FILE), encoding='utf-8') as f:
+            meta = json.load(f)
+        values = np.load(os.path.join(directory, VALUES_FILE), mmap_mode='r')
+        return cls(values, meta['depths'], meta['north'], meta['west'], meta['cellsize'])
+
+    def _columns(self, col):
+        if self.is_global:
+            return col % self.cols
+        return np.clip(col, 0, self.cols - 1)
+
+    def sample(self, lat, lon, depths=DEPTH_RANGES):
+        """
+        Bulk density at many points at once.
+
+        Args:
+            lat, lon: scalars or equally shaped arrays, in degrees
+            depths: depth labels to return, in this order
+
+        Returns:
+            ndarray: kg/m³ shaped (points, depths), NaN where no neighbour has data
+                     and for depths the raster was built without
+        """
+        lat, lon = np.atleast_1d(lat).astype(float).ravel(), np.atleast_1d(lon).astype(float).ravel()
+
+        # Fractional positions relative to cell centres
+        row = (self.north - lat) / self.cellsize - 0.5
+        col = (lon - self.west) / self.cellsize - 0.5
+        r0, c0 = np.floor(row).astype(np.intp), np.floor(col).astype(np.intp)
+        fr, fc = row - r0, col - c0
+        rows = np.clip(np.stack([r0, r0, r0 + 1, r0 + 1]), 0, self.rows - 1)
+        cols = self._columns(np.stack([c0, c0 + 1, c0, c0 + 1]))
+        weights = np.stack([(1 - fr) * (1 - fc), (1 - fr) * fc, fr * (1 - fc), fr * fc])
+
+        bands = np.array([self.depths.index(d) for d in depths if d in self.depths], dtype=np.intp)
+        values = np.asarray(self.values[bands[:, None, None], rows, cols], dtype=float)  # (bands, 4, points)
+        valid = values != NODATA
+        weight = np.where(valid, weights, 0.0)
+        total = weight.sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            density = (values * weight).sum(axis=1) / total
+        density[total <= 0] = np.nan
+        result = np.full((len(lat), len(depths)), np.nan)
+        result[:, [i for i, d in enumerate(depths) if d in self.depths]] = density.T * SCALE['bdod']
+        return result
+
+@lru_cache(maxsize=1)
+def soil_raster():
+    """Shared raster instance, or None when none has been built"""
+    if not os.path.exists(os.path.join(SOIL_RASTER_DIR, VALUES_FILE)):
+        return None
+    return SoilRaster.load(SOIL_RASTER_DIR)
+
+def build_soil_raster(sources, directory=SOIL_RASTER_DIR):
+    """
+    Stack per-depth bulk-density rasters into the memory-mappable layout.
+
+    Args:
+        sources: {depth label: ESRI ASCII grid in SoilGrids units (cg/cm³)},
+                 all on the same grid, e.g. exported with
+                 gdal_translate -of AAIGrid -tr 0.1 0.1 bdod_<depth>_mean.vrt <depth>.asc
+        directory: output directory
+    """
+    depths = [d for d in DEPTH_RANGES if d in sources]
+    os.makedirs(directory, exist_ok=True)
+    values = None
+    for band, depth in enumerate(depths):
+        data, north, west, cellsize, nodata = read_ascii_grid(sources[depth])
+        if values is None:
+            grid = (north, west, cellsize)
+            values = np.lib.format.open_memmap(os.path.join(directory, VALUES_FILE), mode='w+',
+                                               dtype=np.uint16, shape=(len(depths),) + data.shape)
+        elif (north, west, cellsize) != grid or data.shape != values.shape[1:]:
+            raise ValueError(f"{sources[depth]} is not on the same grid as {sources[depths[0]]}")
+        missing = ~np.isfinite(data) | (data <= 0)
+        if nodata is not None:
+            missing |= data == nodata
+        values[band] = np.where(missing, NODATA, np.clip(np.rint(data), 1, np.iinfo(np.uint16).max))
+    values.flush()
+    with open(os.path.join(directory, META_FILE), 'w', encoding='utf-8') as f:
+        json.dump({'depths': depths, 'north': grid[0], 'west': grid[1], 'cellsize': grid[2]}, f)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build the offline soil bulk-density raster")
+    parser.add_argument('sources', nargs='+', metavar='DEPTH=PATH',
+                        help="ESRI ASCII grid per depth, e.g. 100-200cm=bdod_100-200cm.asc")
+    parser.add_argument('--output', default=SOIL_RASTER_DIR)
+    args = parser.parse_args()
+    sources = dict(source.split('=', 1) for source in args.sources)
+    unknown = set(sources) - set(DEPTH_RANGES)
+    if unknown:
+        parser.error(f"unknown depths {sorted(unknown)}; expected {DEPTH_RANGES}")
+    build_soil_raster(sources, args.output)
+    print(f"Soil raster written to {args.output}")
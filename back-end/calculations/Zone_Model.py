@@ -0,0 +1,132 @@
+import os
+import json
+import argparse
+from functools import lru_cache
+import numpy as np
+from calculations.City_Index import PointIndex
+from calculations.Dataset_Store import compiled
+from calculations.Geometry import great_circle_distance
+
+PARENT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+COASTLINE_FILE = os.getenv('COASTLINE_FILE', os.path.join(PARENT_DIR, "coastline.npy"))
+COASTLINE_CELL_DEG = 0.25
+COASTLINE_SAMPLE_KM = 2       # max spacing between stored coastline points
+COASTAL_DISTANCE_KM = 25      # impacts closer than this to a coastline are coastal
+
+REFERENCE_ENERGY_MT = 10      # energy the base radii below are given for
+
+# Damage zones per terrain: (id, radius in km at REFERENCE_ENERGY_MT).
+# Radii scale with the cube root of the energy.
+ZONES = {
+    'land': (
+        ('crater', 3),
+        ('thermal', 25),
+        ('airblast', 60),
+        ('ejecta', 120),
+        ('seismic', 200),
+    ),
+    'ocean': (
+        ('tsunami', 300),
+        ('vapor_cloud', 80),
+    ),
+    'coastal': (
+        ('mixed_wave', 150),
+        ('shockwave', 40),
+    ),
+}
+
+# get_location_type() result -> zone terrain (ice sheets behave like land)
+TERRAIN_BY_LOCATION = {
+    'land': 'land',
+    'water': 'ocean',
+    'coastal': 'coastal',
+    'antarctica': 'land',
+    'greenland': 'land',
+}
+
+_BASE_RADII = {terrain: np.array([radius for _, radius in zones], dtype=float)
+               for terrain, zones in ZONES.items()}
+
+def zone_ids(terrain):
+    return [zone_id for zone_id, _ in ZONES[terrain]]
+
+def zone_radii(terrain, energies_mt):
+    """
+    Zone radii for many energies at once.
+
+    Args:
+        terrain: key of ZONES
+        energies_mt: scalar or array of energies in megatons
+
+    Returns:
+        ndarray: radii in km shaped energies.shape + (zones,), in ZONES order
+    """
+    scale = np.cbrt(np.asarray(energies_mt, dtype=float) / REFERENCE_ENERGY_MT)
+    return scale[..., None] * _BASE_RADII[terrain]
+
+def zone_radius(terrain, zone_id, energy_mt):
+    """Radius in km of a single zone"""
+    return float(zone_radii(terrain, energy_mt)[zone_ids(terrain).index(zone_id)])
+
+def zones_for(terrain, energy_mt):
+    """Zones as [{'id', 'radius'}] for one energy, in ZONES order"""
+    return [{'id': zone_id, 'radius': float(radius)}
+            for zone_id, radius in zip(zone_ids(terrain), zone_radii(terrain, energy_mt))]
+
+@lru_cache(maxsize=1)
+def coastline_index():
+    """Index over the offline coastline points, or None when none has been built"""
+    if not os.path.exists(COASTLINE_FILE):
+        return None
+
+    def build():
+        points = np.load(COASTLINE_FILE, mmap_mode='r')
+        return PointIndex(points[:, 0], points[:, 1], COASTLINE_CELL_DEG).arrays()
+
+    arrays = compiled('coastline', [COASTLINE_FILE], build)
+    return PointIndex(cell_deg=COASTLINE_CELL_DEG, **arrays)
+
+def distance_to_coast(lat, lon, max_km=COASTAL_DISTANCE_KM):
+    """Distance in km to the nearest coastline point within max_km, or None"""
+    index = coastline_index()
+    if index is None:
+        return None
+    return index.nearest_distance(lat, lon, max_km)
+
+def is_coastal(lat, lon):
+    return distance_to_coast(lat, lon) is not None
+
+def densify(line, max_km=COASTLINE_SAMPLE_KM):
+    """Interpolate extra [lon, lat] vertices so no gap along a line exceeds max_km"""
+    line = np.asarray(line, dtype=float)[:, :2]
+    if len(line) < 2:
+        return line
+    gaps = great_circle_distance(line[:-1, 1], line[:-1, 0], line[1:, 1], line[1:, 0])
+    steps = np.maximum(np.ceil(gaps / max_km).astype(int), 1)
+    parts = [line[i] + (line[i + 1] - line[i]) * np.arange(n)[:, None] / n
+             for i, n in enumerate(steps)]
+    return np.vstack(parts + [line[-1:]])
+
+def build_coastline(source, output=COASTLINE_FILE):
+    """
+    Convert coastline GeoJSON (e.g. Natural Earth ne_10m_coastline) into a
+    float32 array of (lat, lon) points for coastline_index().
+    """
+    with open(source, encoding='utf-8') as f:
+        features = json.load(f)['features']
+    points = []
+    for feature in features:
+        geometry = feature['geometry']
+        lines = [geometry['coordinates']] if geometry['type'] == 'LineString' else geometry['coordinates']
+        for line in lines:
+            dense = densify(line)
+            points.append(dense[:, ::-1])
+    np.save(output, np.vstack(points).astype(np.float32))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build the offline coastline index")
+    parser.add_argument('source', help="coastline GeoJSON (LineString/MultiLineString features)")
+    parser.add_argument('--output', default=COASTLINE_FILE)
+    args = parser.parse_args()
+    build_coastline(args.source, args.output)
+    print(f"Coastline points written to {args.output}")
@@ -0,0 +1,27 @@
+import os
+import sys
+import threading
+import subprocess
+
+# Gunicorn picks this file up from the working directory. Workers start serving
+# immediately; modules and datasets are loaded in the background unless WARM_UP=0.
+
+def on_starting(server):
+    # Compile the memory-mapped datasets once, before forking, so workers
+    # never race to build them and share their pages through the page cache.
+    # This runs in a child process: the master never imports the app or opens
+    # a dataset, so a HUP reload starts workers on fresh code and data.
+    if os.getenv('WARM_UP', '1') == '0':
+        return
+    subprocess.run([sys.executable, '-m', 'calculations.Dataset_Store'], check=True,
+                   cwd=os.path.dirname(os.path.abspath(__file__)))
+
+def on_reload(server):
+    # HUP: recompile anything whose sources changed before the new workers start
+    on_starting(server)
+
+def post_worker_init(worker):
+    if os.getenv('WARM_UP', '1') == '0':
+        return
+    from app import warm_up
+    threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
@@ -0,0 +1,69 @@
+import os
+import time
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from calculations import Batch_Jobs
+
+LOCATIONS = [{'latitude': 10.0, 'longitude': 20.0}]
+
+@pytest.fixture(autouse=True)
+def jobs_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(Batch_Jobs, 'JOBS_DIR', str(tmp_path))
+
+def wait_for_terminal(job_id, timeout_s=5):
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        status = Batch_Jobs.job_status(job_id)
+        if status['status'] in Batch_Jobs.TERMINAL_STATUSES:
+            return status
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} still {status['status']}")
+
+@pytest.mark.parametrize('asteroids', [[{'asteroid_id': [1]}], [{'asteroid_id': {'a': 1}}],
+                                       [{'asteroid_id': True}], ['2000433'], {'asteroid_id': '1'}])
+def test_malformed_asteroids_are_rejected(asteroids):
+    with pytest.raises(ValueError):
+        Batch_Jobs.expand_scenarios({'asteroids': asteroids, 'locations': LOCATIONS})
+
+def test_unexpected_error_ends_job_as_failed(monkeypatch):
+    def broken_pool():
+        raise Batch_Jobs.BrokenProcessPool("worker died")
+    monkeypatch.setattr(Batch_Jobs, 'executor', broken_pool)
+    status = Batch_Jobs.submit_job({'asteroids': [{'diameter': 50, 'velocity': 20000, 'mass': 1e8}],
+                                    'locations': LOCATIONS}, lambda asteroid_id: None)
+    final = wait_for_terminal(status['job_id'])
+    assert final['status'] == 'failed'
+    assert 'worker died' in final['error']
+    # The stream ends instead of polling forever
+    assert list(Batch_Jobs.stream_results(status['job_id'])) == []
+
+def test_stream_stops_after_max_duration(monkeypatch):
+    monkeypatch.setattr(Batch_Jobs, 'STREAM_MAX_S', 0)
+    monkeypatch.setattr(Batch_Jobs, 'job_status', lambda job_id: {'status': 'running'})
+    assert list(Batch_Jobs.stream_results('abc123')) == []
+
+def test_sweep_removes_only_jobs_past_retention(tmp_path):
+    old, recent = tmp_path / "aaa111", tmp_path / "bbb222"
+    for job in (old, recent):
+        job.mkdir()
+        (job / Batch_Jobs.STATUS_FILE).write_text('{"status": "completed"}')
+    stale = time.time() - 2 * 86400
+    os.utime(old / Batch_Jobs.STATUS_FILE, (stale, stale))
+    assert Batch_Jobs.sweep_jobs(max_age_s=86400) == 1
+    assert not old.exists() and recent.exists()
+
+def test_ground_density_resolved_once_per_location(monkeypatch):
+    lookups, submitted = [], []
+    def get_densities(lat, lon):
+        lookups.append(list(zip(lat, lon)))
+        return [{'100-200cm': 1500.0} for _ in lat]
+    monkeypatch.setattr(Batch_Jobs, 'get_densities', get_densities)
+    monkeypatch.setattr(Batch_Jobs, 'run_scenario', lambda params: submitted.append(params) or {})
+    monkeypatch.setattr(Batch_Jobs, 'executor', lambda: ThreadPoolExecutor(max_workers=1))
+    asteroids = [{'diameter': 50 + n, 'velocity': 20000, 'mass': 1e8} for n in range(40)]
+    status = Batch_Jobs.submit_job({'asteroids': asteroids, 'locations': LOCATIONS + [{'latitude': 95, 'longitude': 0}]},
+                                   lambda asteroid_id: None)
+    final = wait_for_terminal(status['job_id'])
+    assert final['status'] == 'completed' and final['failed'] == 40
+    assert lookups == [[(10.0, 20.0)]]
+    assert len(submitted) == 40 and all(p['ground_density'] == {'100-200cm': 1500.0} for p in submitted)
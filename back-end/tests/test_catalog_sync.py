@@ -0,0 +1,20 @@
+from collections import OrderedDict
+from calculations import Catalog_Sync
+
+class FixedCatalog:
+    def version(self, asteroid_id):
+        return "v1"
+
+def test_derived_results_are_bounded_lru(monkeypatch):
+    monkeypatch.setattr(Catalog_Sync, 'catalog', FixedCatalog)
+    monkeypatch.setattr(Catalog_Sync, '_derived', OrderedDict())
+    monkeypatch.setattr(Catalog_Sync, 'DERIVED_MAX_ENTRIES', 2)
+    computed = []
+    def compute(asteroid_id):
+        return lambda: computed.append(asteroid_id) or asteroid_id
+
+    for asteroid_id in ('a', 'b', 'a', 'c'):
+        Catalog_Sync.derived(asteroid_id, 'orbit', compute(asteroid_id))
+    assert list(Catalog_Sync._derived) == [('a', 'orbit'), ('c', 'orbit')]
+    Catalog_Sync.derived('b', 'orbit', compute('b'))
+    assert computed == ['a', 'b', 'c', 'b']
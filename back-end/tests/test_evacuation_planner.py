@@ -0,0 +1,60 @@
+import time
+import numpy as np
+import pytest
+from calculations.City_Index import CityIndex
+from calculations.Evacuation_Planner import (HOST_CAPACITY_RATIO, SAFE_MARGIN_KM, plan_evacuation,
+                                             safe_destinations)
+
+def synthetic_index(count=20_000, seed=0):
+    rng = np.random.default_rng(seed)
+    lat, lon = rng.uniform(-56, 70, count), rng.uniform(-180, 180, count)
+    population = rng.lognormal(10.5, 1.2, count).astype(int).astype(float)
+    return CityIndex(None, lat=lat, lon=lon, population=population)
+
+@pytest.mark.parametrize('radius_km', [600, 1500, 3000])
+def test_assignments_respect_capacity_and_use_all_of_it(radius_km):
+    index = synthetic_index()
+    lat, lon = 20.0, -100.0
+    affected, distances = index.query_radius(lat, lon, radius_km)
+    population = index.population[affected].astype(np.int64)
+    plan = plan_evacuation(index, affected, distances, lat, lon, radius_km)
+
+    safe = safe_destinations(index, lat, lon, radius_km + SAFE_MARGIN_KM, population.sum())
+    capacity = dict(zip(safe.tolist(), np.floor(HOST_CAPACITY_RATIO * index.population[safe]).astype(np.int64)))
+    hosted = dict.fromkeys(capacity, 0)
+
+    assert sorted(entry['position'] for entry in plan) == list(range(len(affected)))
+    for entry in plan:
+        city = affected[entry['position']]
+        moved = sum(evacuees for _, evacuees, _ in entry['destinations'])
+        assert moved + entry['unassigned'] == population[entry['position']]
+        for host, evacuees, _ in entry['destinations']:
+            assert host not in affected and evacuees > 0
+            hosted[host] += evacuees
+        assert city not in capacity
+
+    assert all(hosted[host] <= capacity[host] for host in capacity)
+    # Nobody is left behind while any safe destination still has room
+    unassigned = sum(entry['unassigned'] for entry in plan)
+    spare = sum(capacity[host] - hosted[host] for host in capacity)
+    assert unassigned == 0 or spare == 0
+    assert unassigned == max(population.sum() - sum(capacity.values()), 0)
+
+def test_plan_fills_nearest_hosts_first():
+    index = synthetic_index(5_000, seed=1)
+    affected, distances = index.query_radius(0.0, 0.0, 800)
+    plan = plan_evacuation(index, affected, distances, 0.0, 0.0, 800)
+    first = plan[0]
+    travel = [km for _, _, km in first['destinations']]
+    assert travel == sorted(travel)
+
+def test_plan_for_thousands_of_cities_stays_fast():
+    # Refills must not rescan every safe city per affected city (this took ~2.8 s)
+    index = synthetic_index(100_000, seed=1)
+    affected, distances = index.query_radius(20.0, -100.0, 3000)
+    assert len(affected) > 5_000
+    start = time.perf_counter()
+    plan = plan_evacuation(index, affected, distances, 20.0, -100.0, 3000)
+    elapsed = time.perf_counter() - start
+    assert sum(entry['unassigned'] for entry in plan) == 0
+    assert elapsed < 1.5
@@ -0,0 +1,13 @@
+import numpy as np
+from calculations import Coords_Info, Soil_Profile
+
+def test_densities_query_soilgrids_once_per_cell(monkeypatch):
+    queries = []
+    def fetch_profile(lat, lon, depths, properties):
+        queries.append((lat, lon))
+        return np.full((len(properties), len(depths)), 1500.0)
+    monkeypatch.setattr(Coords_Info, '_fixed_density', lambda lat, lon, radius_km, depths: None)
+    monkeypatch.setattr(Soil_Profile, 'fetch_profile', fetch_profile)
+    densities = Coords_Info.get_densities([10.0] * 40 + [10.0001, 30.0], [20.0] * 41 + [40.0])
+    assert sorted(queries) == [(10.0, 20.0), (30.0, 40.0)]
+    assert len(densities) == 42 and all(d['100-200cm'] == 1500.0 for d in densities)
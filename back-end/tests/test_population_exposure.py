@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+from calculations.Geometry import bounding_box, great_circle_distance
+from calculations.Population_Exposure import PopulationGrid
+
+CELLSIZE = 0.5
+
+@pytest.fixture(scope='module')
+def grid():
+    rng = np.random.default_rng(0)
+    counts = rng.lognormal(8, 1.5, (int(180 / CELLSIZE), int(360 / CELLSIZE)))
+    row_prefix = np.zeros((counts.shape[0], counts.shape[1] + 1))
+    np.cumsum(counts, axis=1, out=row_prefix[:, 1:])
+    return PopulationGrid(row_prefix, 90.0, -180.0, CELLSIZE), counts
+
+def brute_force_cap(counts, lat, lon, radius_km):
+    """
+    Population within radius_km, sampling every cell the cap's bounding box
+    touches on a sub-grid about radius_km / 40 fine, sub-rows area-weighted.
+    """
+    fine = max(24, int(np.ceil(CELLSIZE * 111.2 / (radius_km / 40))))
+    offsets = (np.arange(fine) + 0.5) / fine
+    south, north, west, east = bounding_box(lat, lon, radius_km)
+    rows = range(int((90 - north) // CELLSIZE), min(int((90 - south) // CELLSIZE) + 1, counts.shape[0]))
+    if east - west >= 360:
+        cols = np.arange(counts.shape[1])
+    else:
+        first, last = int((west + 180) // CELLSIZE), int((east + 180) // CELLSIZE)
+        cols = np.arange(first, last + 1 if first <= last else last + 1 + counts.shape[1]) % counts.shape[1]
+    total = 0.0
+    for r in rows:
+        top = 90.0 - r * CELLSIZE
+        edges = top - CELLSIZE * np.arange(fine + 1) / fine
+        area = np.abs(np.sin(np.radians(edges[:-1])) - np.sin(np.radians(edges[1:])))
+        area /= area.sum()
+        sub_lat = top - CELLSIZE * offsets
+        sub_lon = -180.0 + CELLSIZE * (cols[:, None] + offsets).ravel()
+        inside = great_circle_distance(lat, lon, sub_lat[:, None], sub_lon[None, :]) <= radius_km
+        share = (inside * area[:, None]).reshape(fine, len(cols), fine).sum(axis=(0, 2)) / fine
+        total += (share * counts[r, cols]).sum()
+    return total
+
+@pytest.mark.parametrize('lat, lon, radius_km', [
+    (20.0, -100.0, 3),
+    (20.0, -100.0, 20),
+    (20.1, -99.9, 25),
+    (-33.7, 151.2, 60),
+    (64.0, 179.9, 150),
+    (0.0, 0.0, 800),
+    (88.0, 10.0, 400),
+])
+def test_cap_total_matches_brute_force(grid, lat, lon, radius_km):
+    population_grid, counts = grid
+    expected = brute_force_cap(counts, lat, lon, radius_km)
+    assert expected > 0
+    assert population_grid.cap_total(lat, lon, radius_km) == pytest.approx(expected, rel=0.02)
+
+def test_small_inner_rings_are_not_empty(grid):
+    population_grid, _ = grid
+    rings = population_grid.ring_totals(20.0, -100.0, [3, 25, 60, 150])
+    assert all(ring > 0 for ring in rings)
@@ -0,0 +1,52 @@
+import pytest
+import requests
+from calculations import Resilience
+from calculations.Resilience import FAILURE_THRESHOLD, UpstreamRejected, UpstreamUnavailable, call_upstream
+
+class Response:
+    def __init__(self, status_code, payload=None):
+        self.status_code = status_code
+        self.payload = payload or {}
+
+    def json(self):
+        return self.payload
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(str(self.status_code))
+
+@pytest.fixture
+def breaker():
+    breaker = Resilience.breaker('nasa_neows')
+    breaker.record_success()
+    yield breaker
+    breaker.record_success()
+
+def test_client_errors_do_not_open_the_breaker(breaker):
+    for _ in range(FAILURE_THRESHOLD * 2):
+        with pytest.raises(UpstreamRejected) as rejected:
+            call_upstream('nasa_neows', lambda timeout: Response(404))
+        assert rejected.value.status == 404
+    assert breaker.state == 'closed'
+    assert call_upstream('nasa_neows', lambda timeout: Response(200, {'ok': True})) == {'ok': True}
+
+def test_client_errors_use_the_fallback(breaker):
+    assert call_upstream('nasa_neows', lambda timeout: Response(400), fallback=lambda: 'fallback') == 'fallback'
+
+@pytest.mark.parametrize('status', [429, 500, 503])
+def test_server_errors_and_throttling_open_the_breaker(breaker, status):
+    for _ in range(FAILURE_THRESHOLD):
+        with pytest.raises(UpstreamUnavailable):
+            call_upstream('nasa_neows', lambda timeout: Response(status))
+    assert breaker.state == 'open'
+    with pytest.raises(UpstreamUnavailable) as unavailable:
+        call_upstream('nasa_neows', lambda timeout: Response(200))
+    assert unavailable.value.reason == 'circuit_open'
+
+def test_timeouts_count_as_failures(breaker):
+    def send(timeout):
+        raise requests.exceptions.Timeout()
+    for _ in range(FAILURE_THRESHOLD):
+        with pytest.raises(UpstreamUnavailable):
+            call_upstream('nasa_neows', send)
+    assert breaker.state == 'open'